@@ -0,0 +1,55 @@
+import math
+import time
+
+from config.cache import TTLCache
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per client: each client may make burst requests at once
+    and rate requests per second on average.
+
+    An idle bucket refills completely after burst / rate seconds, so it is
+    kept in a bounded TTL cache and simply forgotten after that time.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = TTLCache(max_size=max_clients, ttl=burst / rate)
+
+    def acquire(self, client: str) -> float:
+        """
+        Takes a token for the client. Returns 0 if the request is allowed,
+        otherwise the number of seconds until a token is available.
+        """
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(client) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+        self.buckets.set(client, (tokens - 1, now))
+        return 0.0
+
+
+class InFlightLimit:
+    """
+    Limits the number of requests of a route class processed at once.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+def retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,153 @@
+import json
+
+from admission.limits import InFlightLimit, TokenBucketLimiter, retry_after
+from config.config import AdmissionConfig, settings
+from config.database import db_helper
+from metrics.collectors import ADMISSION_REJECTED
+from metrics.pool import request_checkout
+from starlette.types import ASGIApp, Receive, Scope, Send
+from users.cache import auth_cache
+
+# Route classes by path prefix, checked in order; other paths are only
+# rate limited. Streams and long polls hold no database connection while
+# they wait, so they are not counted towards the in-flight limit of /result.
+# Exports hold a connection for as long as they stream, so they have their
+# own limit rather than taking the slots of /history pages.
+ROUTE_CLASSES = (
+    ("/result/stream", "stream"),
+    ("/results", "poll"),
+    ("/result", "result"),
+    ("/history/export", "export"),
+    ("/history", "history"),
+    ("/stats", "history"),
+    ("/user", "auth"),
+    ("/query", "query"),
+)
+# Served without touching the database
+EXEMPT_PATHS = ("/ping", "/metrics", "/docs", "/redoc", "/openapi.json")
+
+
+def route_class(path: str) -> str:
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return "other"
+
+
+def client_key(scope: Scope) -> str:
+    """
+    Identifies the client as the user of a recently seen access token,
+    or by its address.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            username = auth_cache.tokens.get(token)
+            if scheme.lower() == "bearer" and username is not None:
+                return f"user:{username}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class AdmissionMiddleware:
+    """
+    Rejects requests early, before they queue for a database connection:
+    with 429 when a client exceeds its rate, and with 503 when a route
+    class has too many requests in flight or the connection pool is
+    saturated (too many checkouts waiting, or waiting for too long).
+    The requests that are accepted keep a bounded latency.
+    """
+
+    def __init__(self, app: ASGIApp, config: AdmissionConfig = settings.admission):
+        self.app = app
+        self.config = config
+        self.limiter = (
+            TokenBucketLimiter(config.rate, config.burst, config.max_clients)
+            if config.rate > 0
+            else None
+        )
+        self.in_flight = {
+            "result": InFlightLimit(config.result_in_flight),
+            "history": InFlightLimit(config.history_in_flight),
+            "export": InFlightLimit(config.export_in_flight),
+            "auth": InFlightLimit(config.auth_in_flight),
+        }
+
+    def pool_saturated(self) -> bool:
+        """
+        Judged by the checkouts of requests only, see `request_checkout`.
+        """
+        pool = db_helper.engine.pool
+        # Only the instrumented queue pool tracks its waiting checkouts
+        if not hasattr(pool, "waiters"):
+            return False
+        return (
+            pool.queue_depth >= self.config.pool_max_queue
+            or pool.longest_wait() >= self.config.pool_max_wait
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not self.config.enabled
+            or path.startswith(EXEMPT_PATHS)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        marker = request_checkout.set(True)
+        try:
+            await self.admit(scope, receive, send, path)
+        finally:
+            request_checkout.reset(marker)
+
+    async def admit(
+        self, scope: Scope, receive: Receive, send: Send, path: str
+    ) -> None:
+        name = route_class(path)
+        if self.limiter is not None:
+            wait = self.limiter.acquire(client_key(scope))
+            if wait:
+                await self.reject(send, name, "rate", 429, retry_after(wait))
+                return
+
+        if self.pool_saturated():
+            await self.reject(send, name, "pool", 503, self.config.retry_after)
+            return
+
+        limit = self.in_flight.get(name)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        if not limit.acquire():
+            await self.reject(send, name, "in_flight", 503, self.config.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    async def reject(
+        self, send: Send, name: str, reason: str, status: int, retry_after: str
+    ) -> None:
+        ADMISSION_REJECTED.labels(name, reason).inc()
+        detail = (
+            "Too many requests"
+            if status == 429
+            else "Server is overloaded, retry later"
+        )
+        body = json.dumps({"detail": detail}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
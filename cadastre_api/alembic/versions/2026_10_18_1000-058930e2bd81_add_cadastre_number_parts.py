@@ -0,0 +1,72 @@
+"""add cadastre number parts
+
+Revision ID: 058930e2bd81
+Revises: 092eddacf318
+Create Date: 2026-10-18 10:00:12.481530
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "058930e2bd81"
+down_revision: Union[str, None] = "092eddacf318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+PARTS = ("district", "area", "quarter", "parcel")
+FILL_PARTS = (
+    "UPDATE query SET "
+    "district = split_part(cadastre_number, ':', 1)::integer, "
+    "area = split_part(cadastre_number, ':', 2)::integer, "
+    "quarter = split_part(cadastre_number, ':', 3)::integer, "
+    "parcel = split_part(cadastre_number, ':', 4)::integer "
+    "WHERE district IS NULL"
+)
+
+
+def upgrade() -> None:
+    # Nullable columns without defaults are added without rewriting the table
+    for part in PARTS:
+        op.add_column("query", sa.Column(part, sa.Integer(), nullable=True))
+
+    # Each batch and each index is committed separately, so the table
+    # is never locked for the whole backfill
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.scalar(sa.text("SELECT max(id) FROM query")) or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            connection.execute(
+                sa.text(f"{FILL_PARTS} AND id > :start AND id <= :stop"),
+                {"start": start, "stop": start + BATCH_SIZE},
+            )
+
+        op.create_index(
+            "ix_query_cadastre_number_id",
+            "query",
+            ["cadastre_number", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_query_cadastre_parts",
+            "query",
+            list(PARTS),
+            postgresql_concurrently=True,
+        )
+
+    # Catch up rows inserted during the backfill by the running application,
+    # which writes only cadastre_number; the lock keeps new ones out until
+    # the migration commits, and the parts index finds the rows left
+    op.execute("LOCK TABLE query IN SHARE ROW EXCLUSIVE MODE")
+    op.execute(FILL_PARTS)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_query_cadastre_parts", table_name="query")
+    op.drop_index("ix_query_cadastre_number_id", table_name="query")
+    for part in reversed(PARTS):
+        op.drop_column("query", part)
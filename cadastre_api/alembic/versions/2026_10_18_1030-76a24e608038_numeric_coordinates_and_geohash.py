@@ -0,0 +1,149 @@
+"""numeric coordinates and geohash
+
+Revision ID: 76a24e608038
+Revises: 058930e2bd81
+Create Date: 2026-10-18 10:30:41.902117
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "76a24e608038"
+down_revision: Union[str, None] = "058930e2bd81"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+COLUMNS = ("latitude", "longitude", "geohash")
+# Copied from queries.geo as of this revision: the migration must not
+# change when the application code does
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+
+
+def encode_geohash(latitude: float, longitude: float) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < GEOHASH_PRECISION:
+        if even:
+            bounds, coordinate = lon_range, longitude
+        else:
+            bounds, coordinate = lat_range, latitude
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def backfill(connection: sa.Connection, start: int, stop: int | None) -> None:
+    """
+    Fills numeric coordinates and geohash for rows with ids in (start, stop].
+    """
+    condition = "geohash_value IS NULL AND id > :start"
+    if stop is not None:
+        condition += " AND id <= :stop"
+    rows = connection.execute(
+        sa.text(f"SELECT id, latitude, longitude FROM query WHERE {condition}"),
+        {"start": start, "stop": stop},
+    ).all()
+    if not rows:
+        return
+    connection.execute(
+        sa.text(
+            "UPDATE query SET latitude_value = :latitude, "
+            "longitude_value = :longitude, geohash_value = :geohash "
+            "WHERE id = :id"
+        ),
+        [
+            {
+                "id": row.id,
+                "latitude": float(row.latitude),
+                "longitude": float(row.longitude),
+                "geohash": encode_geohash(float(row.latitude), float(row.longitude)),
+            }
+            for row in rows
+        ],
+    )
+
+
+def upgrade() -> None:
+    op.add_column("query", sa.Column("latitude_value", sa.Float(), nullable=True))
+    op.add_column("query", sa.Column("longitude_value", sa.Float(), nullable=True))
+    op.add_column(
+        "query",
+        sa.Column(
+            "geohash_value",
+            sa.String(GEOHASH_PRECISION, collation="C"),
+            nullable=True,
+        ),
+    )
+
+    # The backfill commits batch by batch, so the table is not locked
+    # for the whole run; the old string columns stay readable meanwhile
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.scalar(sa.text("SELECT max(id) FROM query")) or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            backfill(connection, start, start + BATCH_SIZE)
+
+        op.create_index(
+            "ix_query_geohash_value",
+            "query",
+            ["geohash_value"],
+            postgresql_concurrently=True,
+        )
+
+    # Short swap: catch up rows inserted during the backfill, then replace
+    # the string columns; NOT NULL is enforced through a NOT VALID check
+    # so that the exclusive lock does not wait for a full table scan.
+    # The lock is taken first: the running application writes only the
+    # string columns, and its rows must not slip in after the catch-up
+    op.execute("LOCK TABLE query IN ACCESS EXCLUSIVE MODE")
+    backfill(op.get_bind(), 0, None)
+    for column in ("latitude", "longitude"):
+        op.drop_column("query", column)
+    for column in COLUMNS:
+        op.alter_column("query", f"{column}_value", new_column_name=column)
+        op.execute(
+            f"ALTER TABLE query ADD CONSTRAINT ck_query_{column}_not_null "
+            f"CHECK ({column} IS NOT NULL) NOT VALID"
+        )
+    op.execute("ALTER INDEX ix_query_geohash_value RENAME TO ix_query_geohash")
+
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.execute(
+                "ALTER TABLE query " f"VALIDATE CONSTRAINT ck_query_{column}_not_null"
+            )
+            op.alter_column("query", column, nullable=False)
+            op.execute(f"ALTER TABLE query DROP CONSTRAINT ck_query_{column}_not_null")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_query_geohash", table_name="query")
+    op.drop_column("query", "geohash")
+    for column in ("latitude", "longitude"):
+        op.alter_column(
+            "query",
+            column,
+            type_=sa.String(),
+            postgresql_using=f"{column}::text",
+        )
@@ -0,0 +1,69 @@
+"""create lookup job table
+
+Revision ID: 0074b9489fe7
+Revises: 76a24e608038
+Create Date: 2026-10-18 11:00:27.518803
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0074b9489fe7"
+down_revision: Union[str, None] = "76a24e608038"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lookup_job",
+        sa.Column("query_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "pending",
+                "running",
+                "done",
+                "failed",
+                name="jobstatus",
+                native_enum=False,
+                length=16,
+            ),
+            server_default="pending",
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("leased_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("query_id", name=op.f("pk_lookup_job")),
+    )
+    op.create_index(
+        "ix_lookup_job_active",
+        "lookup_job",
+        ["query_id"],
+        postgresql_where=sa.text("status IN ('pending', 'running')"),
+    )
+    # Queries without a result left over from the in-memory queue
+    op.execute(
+        "INSERT INTO lookup_job (query_id) " "SELECT id FROM query WHERE result IS NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lookup_job_active", table_name="lookup_job")
+    op.drop_table("lookup_job")
@@ -0,0 +1,149 @@
+"""partition query table by month
+
+Revision ID: 9e84dabdcefb
+Revises: 0074b9489fe7
+Create Date: 2026-10-18 11:30:09.264418
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9e84dabdcefb"
+down_revision: Union[str, None] = "0074b9489fe7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+# Copied from queries.geo and queries.partitions as of this revision:
+# the migration must not change when the application code does
+GEOHASH_PRECISION = 12
+PARTITION_PREFIX = "query_p"
+INDEXES = {
+    "ix_query_cadastre_number_id": ["cadastre_number", "id"],
+    "ix_query_cadastre_parts": ["district", "area", "quarter", "parcel"],
+    "ix_query_geohash": ["geohash"],
+}
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y_%m}"
+
+
+def upgrade() -> None:
+    now = datetime.now(timezone.utc)
+    # The existing table becomes the first partition, covering everything
+    # up to the end of the current month, so no rows are copied
+    cutoff = month_start(now, 1).isoformat()
+
+    # A constant default does not rewrite the table; existing rows get
+    # the migration time as their creation time
+    op.execute(
+        "ALTER TABLE query ADD COLUMN created_at timestamp with time zone "
+        f"NOT NULL DEFAULT '{now.isoformat()}'"
+    )
+    op.add_column(
+        "query",
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+    # A validated check matching the partition bound lets ATTACH skip
+    # the full table scan under an exclusive lock. ATTACH reuses only an
+    # index that backs a constraint for the new primary key, so the
+    # concurrently built index is turned into a unique constraint
+    with op.get_context().autocommit_block():
+        op.execute(
+            "ALTER TABLE query ADD CONSTRAINT ck_query_legacy_range "
+            f"CHECK (created_at < '{cutoff}') NOT VALID"
+        )
+        op.execute("ALTER TABLE query VALIDATE CONSTRAINT ck_query_legacy_range")
+        op.create_index(
+            "ix_query_legacy_id_created_at",
+            "query",
+            ["id", "created_at"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            "ALTER TABLE query ADD CONSTRAINT uq_query_legacy_id_created_at "
+            "UNIQUE USING INDEX ix_query_legacy_id_created_at"
+        )
+
+    # Short swap: only catalog changes from here on
+    op.execute("ALTER TABLE query RENAME TO query_legacy")
+    op.execute("ALTER TABLE query_legacy RENAME CONSTRAINT pk_query TO pk_query_legacy")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+
+    op.create_table(
+        "query",
+        sa.Column(
+            "id",
+            sa.Integer(),
+            server_default=sa.text("nextval('query_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("cadastre_number", sa.String(), nullable=False),
+        sa.Column("latitude", sa.Float(), nullable=False),
+        sa.Column("longitude", sa.Float(), nullable=False),
+        sa.Column("result", sa.Boolean(), nullable=True),
+        sa.Column(
+            "geohash",
+            sa.String(GEOHASH_PRECISION, collation="C"),
+            nullable=False,
+        ),
+        sa.Column("district", sa.Integer(), nullable=True),
+        sa.Column("area", sa.Integer(), nullable=True),
+        sa.Column("quarter", sa.Integer(), nullable=True),
+        sa.Column("parcel", sa.Integer(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id", "created_at", name=op.f("pk_query")),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    # The sequence must outlive the legacy partition when it is retired
+    op.execute("ALTER SEQUENCE query_id_seq OWNED BY query.id")
+    op.execute(
+        "ALTER TABLE query ATTACH PARTITION query_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{cutoff}')"
+    )
+    # Matching indexes of the legacy partition are attached, not rebuilt
+    for name, columns in INDEXES.items():
+        op.create_index(name, "query", columns)
+    op.execute("ALTER TABLE query_legacy DROP CONSTRAINT ck_query_legacy_range")
+
+    for offset in range(1, MONTHS_AHEAD + 1):
+        start = month_start(now, offset)
+        op.execute(
+            f"CREATE TABLE {partition_name(start)} PARTITION OF query "
+            f"FOR VALUES FROM ('{start.isoformat()}') "
+            f"TO ('{month_start(start, 1).isoformat()}')"
+        )
+
+
+def downgrade() -> None:
+    # Copies every row back into a regular table
+    op.execute("CREATE TABLE query_unpartitioned (LIKE query INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO query_unpartitioned SELECT * FROM query")
+    op.execute("ALTER SEQUENCE query_id_seq OWNED BY query_unpartitioned.id")
+    op.execute("DROP TABLE query")
+    op.execute("ALTER TABLE query_unpartitioned RENAME TO query")
+    op.drop_column("query", "completed_at")
+    op.drop_column("query", "created_at")
+    op.create_primary_key(op.f("pk_query"), "query", ["id"])
+    for name, columns in INDEXES.items():
+        op.create_index(name, "query", columns)
@@ -0,0 +1,44 @@
+"""create query stats table
+
+Revision ID: f9a9e834d34f
+Revises: 9e84dabdcefb
+Create Date: 2026-10-18 12:00:44.730129
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f9a9e834d34f"
+down_revision: Union[str, None] = "9e84dabdcefb"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "query_stats",
+        sa.Column("district", sa.Integer(), nullable=False),
+        sa.Column("area", sa.Integer(), nullable=False),
+        sa.Column("quarter", sa.Integer(), nullable=False),
+        sa.Column("true_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("false_count", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint(
+            "district", "area", "quarter", name=op.f("pk_query_stats")
+        ),
+    )
+    op.execute(
+        "INSERT INTO query_stats "
+        "(district, area, quarter, true_count, false_count) "
+        "SELECT district, area, quarter, "
+        "count(*) FILTER (WHERE result), count(*) FILTER (WHERE NOT result) "
+        "FROM query WHERE result IS NOT NULL AND district IS NOT NULL "
+        "GROUP BY district, area, quarter"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("query_stats")
@@ -0,0 +1,41 @@
+"""delete finished lookup jobs
+
+Revision ID: b41d7e2c9a15
+Revises: 3c5e1a7b9d42
+Create Date: 2026-10-18 13:00:42.615307
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b41d7e2c9a15"
+down_revision: Union[str, None] = "3c5e1a7b9d42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    # Completed jobs are now deleted, their result is kept in the query;
+    # the existing ones are removed in batches, each committed separately
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.scalar(sa.text("SELECT max(query_id) FROM lookup_job")) or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            connection.execute(
+                sa.text(
+                    "DELETE FROM lookup_job WHERE status = 'done' "
+                    "AND query_id > :start AND query_id <= :stop"
+                ),
+                {"start": start, "stop": start + BATCH_SIZE},
+            )
+
+
+def downgrade() -> None:
+    # Deleted jobs are not restored: nothing reads completed jobs
+    pass
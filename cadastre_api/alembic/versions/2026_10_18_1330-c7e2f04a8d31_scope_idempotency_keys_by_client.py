@@ -0,0 +1,38 @@
+"""scope idempotency keys by client
+
+Revision ID: c7e2f04a8d31
+Revises: b41d7e2c9a15
+Create Date: 2026-10-18 13:30:08.917254
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e2f04a8d31"
+down_revision: Union[str, None] = "b41d7e2c9a15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing keys get an empty scope that no client has, so they are
+    # no longer replayed and are purged once they expire
+    op.add_column(
+        "idempotency_key",
+        sa.Column("scope", sa.String(length=255), server_default="", nullable=False),
+    )
+    op.alter_column("idempotency_key", "scope", server_default=None)
+    op.drop_constraint("pk_idempotency_key", "idempotency_key", type_="primary")
+    op.create_primary_key("pk_idempotency_key", "idempotency_key", ["scope", "key"])
+
+
+def downgrade() -> None:
+    # Keys of different clients may coincide; they only live for a day
+    op.execute("DELETE FROM idempotency_key")
+    op.drop_constraint("pk_idempotency_key", "idempotency_key", type_="primary")
+    op.drop_column("idempotency_key", "scope")
+    op.create_primary_key("pk_idempotency_key", "idempotency_key", ["key"])
@@ -0,0 +1,54 @@
+"""
+Local stand-in for the external cadastre server.
+
+Implements the protocol expected by the HTTP external client with a
+configurable delay and error rate, so that the lookup path can be
+load-tested offline (EXTERNAL__CLIENT=http).
+
+Usage (from the cadastre_api directory):
+    python -m benchmarks.external_server --port 8001 --delay 0.05 \\
+        --error-rate 0.1
+"""
+
+import argparse
+import asyncio
+import random
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, status
+from pydantic import BaseModel
+
+
+class LookupRequest(BaseModel):
+    cadastre_number: str
+    latitude: float
+    longitude: float
+
+
+def create_app(delay: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+    app = FastAPI(title="External cadastre server stand-in")
+
+    @app.post("/lookup")
+    async def lookup(request: LookupRequest):
+        await asyncio.sleep(delay + random.uniform(0, jitter))
+        if random.random() < error_rate:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return {"result": random.choice([True, False])}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.delay, args.jitter, args.error_rate),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
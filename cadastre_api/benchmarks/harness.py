@@ -0,0 +1,88 @@
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+from config.base import Base
+from config.config import settings
+from config.database import db_helper
+from main import lifespan, main_app
+from metrics.pool import InstrumentedPool
+
+
+class TimedPool(InstrumentedPool):
+    """
+    Queue pool that records how long each checkout waited for a connection.
+    """
+
+    waits: list[float] = []
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            TimedPool.waits.append(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def app_client(
+    pool_size: int = 10,
+    max_overflow: int = 0,
+    pool_timeout: int = 30,
+    admission: bool = False,
+) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Runs the application in-process against a temporary SQLite database
+    and yields an HTTP client bound to it over the ASGI transport.
+    Admission control is off unless asked for: the benchmarks drive far more
+    concurrent requests than the pool serves and measure how they queue.
+    """
+    settings.admission.enabled = admission
+    with tempfile.TemporaryDirectory() as directory:
+        url = "sqlite+aiosqlite:///" + os.path.join(directory, "bench.db")
+        # The shared helper is rebound in place, because routers and
+        # services hold a reference to this very instance.
+        db_helper.__init__(
+            url=url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            poolclass=TimedPool,
+        )
+        async with db_helper.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        async with lifespan(main_app):
+            transport = httpx.ASGITransport(app=main_app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                yield client
+
+
+class PoolSampler:
+    """
+    Periodically samples the number of checked-out pool connections.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.max_checked_out = 0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            checked_out = db_helper.engine.pool.checkedout()
+            self.max_checked_out = max(self.max_checked_out, checked_out)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self) -> "PoolSampler":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._task.cancel()
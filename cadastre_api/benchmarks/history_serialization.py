@@ -0,0 +1,97 @@
+"""
+Compares the /history read path that loads ORM objects and serializes
+them through the response model and jsonable_encoder with the
+column-projected path serialized by orjson, for pages of 10k and 100k rows.
+
+Each page is read from a temporary SQLite database and rendered to the
+response body; the page size is not limited as it is in the route.
+
+Usage (from the cadastre_api directory):
+    python -m benchmarks.history_serialization
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from benchmarks.harness import app_client
+from config.database import db_helper
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from queries.models import Query
+from queries.responses import FastJSONResponse
+from queries.schemas import HistoryResponse, QueryCreate
+from queries.services import get_history_rows, paginate, query_values
+from sqlalchemy import insert, select
+
+PAGE_SIZES = (10_000, 100_000)
+REPEATS = 3
+INSERT_CHUNK_SIZE = 10_000
+
+HISTORY_FIELD = create_model_field("history", HistoryResponse)
+
+
+async def seed(count: int) -> None:
+    rows = []
+    for number in range(count):
+        request = QueryCreate(
+            cadastre_number=f"77:{number % 10:02}:{number % 1000:07}:{number}",
+            latitude=f"{random.uniform(55, 56):.6f}",
+            longitude=f"{random.uniform(37, 38):.6f}",
+        )
+        rows.append(
+            {
+                **query_values(request),
+                "result": random.choice([True, False]),
+                "completed_at": datetime.now(timezone.utc),
+            }
+        )
+    for start in range(0, count, INSERT_CHUNK_SIZE):
+        async with db_helper.transaction() as db:
+            await db.execute(insert(Query), rows[start : start + INSERT_CHUNK_SIZE])
+
+
+async def orm_path(limit: int) -> bytes:
+    async with db_helper.session_factory() as db:
+        history, next_cursor = await paginate(db, select(Query), None, limit)
+    content = await serialize_response(
+        field=HISTORY_FIELD,
+        response_content=HistoryResponse(items=history, next_cursor=next_cursor),
+    )
+    return JSONResponse(content).body
+
+
+async def projected_path(limit: int) -> bytes:
+    async with db_helper.session_factory() as db:
+        history, next_cursor = await get_history_rows(db, None, None, limit)
+    return FastJSONResponse({"items": history, "next_cursor": next_cursor}).body
+
+
+async def measure(path, limit: int) -> tuple[float, bytes]:
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        body = await path(limit)
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+async def main() -> None:
+    async with app_client():
+        await seed(max(PAGE_SIZES))
+        for limit in PAGE_SIZES:
+            orm_time, orm_body = await measure(orm_path, limit)
+            projected_time, projected_body = await measure(projected_path, limit)
+            print(
+                f"{limit:>7} rows: orm {orm_time * 1000:.0f}ms "
+                f"({len(orm_body) // 1024} KiB), "
+                f"projected {projected_time * 1000:.0f}ms "
+                f"({len(projected_body) // 1024} KiB), "
+                f"{orm_time / projected_time:.1f}x faster"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
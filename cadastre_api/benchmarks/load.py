@@ -0,0 +1,175 @@
+"""
+HTTP load benchmark for the main endpoints.
+
+Runs the application in-process over the ASGI transport against a
+temporary SQLite database, drives every scenario at the given
+concurrency levels and writes latency percentiles, throughput and pool
+wait times to a JSON file that can be diffed between commits.
+
+Usage (from the cadastre_api directory):
+    python -m benchmarks.load --concurrency 1,10,50 --requests 500 \\
+        --output bench_results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import subprocess
+import time
+from typing import Awaitable, Callable
+
+import httpx
+from benchmarks.harness import TimedPool, app_client
+from config.config import settings
+from queries.coalescer import insert_coalescer
+
+QUERY = {"cadastre_number": "77:01:0004:12", "latitude": "55.75", "longitude": "37.61"}
+USER = {"username": "bench", "password": "bench-password"}
+SEED_QUERIES = 1000
+
+Scenario = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies: list[float], elapsed: float, waits: list[float]) -> dict:
+    latencies = sorted(latencies)
+    waits = sorted(waits) or [0.0]
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2),
+        },
+        "pool_wait_ms": {
+            "p50": round(statistics.median(waits) * 1000, 3),
+            "p99": round(percentile(waits, 0.99) * 1000, 3),
+            "max": round(waits[-1] * 1000, 3),
+        },
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, scenario: Scenario, concurrency: int, requests: int
+) -> dict:
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors = 0
+
+    async def user() -> None:
+        nonlocal errors
+        while (number := next(counter)) < requests:
+            started = time.perf_counter()
+            response = await scenario(client, number)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    TimedPool.waits.clear()
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(latencies, elapsed, TimedPool.waits), "errors": errors}
+
+
+def build_scenarios(query_ids: list[int], headers: dict) -> dict[str, Scenario]:
+    usernames = (f"bench-{time.time_ns()}-{number}" for number in itertools.count())
+    return {
+        "query": lambda client, _: client.post("/query", json=QUERY),
+        "result": lambda client, _: client.get(
+            "/result", params={"query_id": random.choice(query_ids)}
+        ),
+        "history": lambda client, _: client.get(
+            "/history", params={"limit": 100}, headers=headers
+        ),
+        "user_token": lambda client, _: client.post("/user/token", json=USER),
+        "user_create": lambda client, _: client.post(
+            "/user/create",
+            json={"username": next(usernames), "password": "bench-password"},
+        ),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> None:
+    settings.external.min_delay = settings.external.max_delay = args.external_delay
+    insert_coalescer.enabled = args.coalesce
+    levels = [int(level) for level in args.concurrency.split(",")]
+    report = {
+        "revision": git_revision(),
+        "requests": args.requests,
+        "pool_size": args.pool_size,
+        "external_delay": args.external_delay,
+        "coalesce": args.coalesce,
+        "admission": args.admission,
+        "scenarios": {},
+    }
+
+    async with app_client(pool_size=args.pool_size, admission=args.admission) as client:
+        await client.post("/user/create", json=USER)
+        token = (await client.post("/user/token", json=USER)).json()["access_token"]
+        response = await client.post("/query/batch", json=[QUERY] * SEED_QUERIES)
+        scenarios = build_scenarios(
+            response.json()["ids"], {"Authorization": f"Bearer {token}"}
+        )
+
+        for name in args.scenarios.split(","):
+            report["scenarios"][name] = {}
+            for concurrency in levels:
+                stats = await run_scenario(
+                    client, scenarios[name], concurrency, args.requests
+                )
+                report["scenarios"][name][str(concurrency)] = stats
+                print(
+                    f"{name:>11} c={concurrency:<4} rps={stats['rps']:<8} "
+                    f"p50={stats['latency_ms']['p50']}ms "
+                    f"p99={stats['latency_ms']['p99']}ms "
+                    f"errors={stats['errors']}"
+                )
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", default="1,10,50")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--external-delay", type=float, default=0.0)
+    parser.add_argument(
+        "--coalesce",
+        action="store_true",
+        help="group concurrent POST /query inserts into shared transactions",
+    )
+    parser.add_argument(
+        "--admission",
+        action="store_true",
+        help="shed load with admission control, as in production",
+    )
+    parser.add_argument(
+        "--scenarios", default="query,result,history,user_token,user_create"
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    asyncio.run(main(parser.parse_args()))
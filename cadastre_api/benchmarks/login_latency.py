@@ -0,0 +1,84 @@
+"""
+Measures event-loop latency while concurrent logins verify bcrypt
+passwords, with hashing offloaded to the executor and inline.
+
+Usage (from the cadastre_api directory):
+    python -m benchmarks.login_latency
+"""
+
+import asyncio
+import statistics
+import time
+
+from benchmarks.harness import app_client
+from users.hashing import password_hasher
+
+CONCURRENCY = 50
+PROBE_INTERVAL = 0.005
+
+USER = {"username": "bench", "password": "bench-password"}
+
+
+class LoopLagProbe:
+    """
+    Records how late the event loop wakes up a periodic sleeper.
+    """
+
+    def __init__(self, interval: float = PROBE_INTERVAL):
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(time.perf_counter() - started - self.interval)
+
+    def __enter__(self) -> "LoopLagProbe":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._task.cancel()
+
+    def summary(self) -> str:
+        lags = sorted(self.lags)
+        p99 = lags[int(len(lags) * 0.99) - 1]
+        return (
+            f"loop lag p50={statistics.median(lags) * 1000:.1f}ms "
+            f"p99={p99 * 1000:.1f}ms max={lags[-1] * 1000:.1f}ms"
+        )
+
+
+async def run_inline(operation: str, func, *args):
+    return func(*args)
+
+
+async def measure(client, label: str) -> None:
+    with LoopLagProbe() as probe:
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.post("/user/token", json=USER) for _ in range(CONCURRENCY))
+        )
+        elapsed = time.perf_counter() - started
+    assert all(response.status_code == 200 for response in responses)
+    print(f"{label:>9}: {CONCURRENCY} logins in {elapsed:.2f}s, {probe.summary()}")
+
+
+async def main() -> None:
+    async with app_client(pool_size=CONCURRENCY) as client:
+        await client.post("/user/create", json=USER)
+
+        await measure(client, "offloaded")
+
+        offloaded_run = password_hasher._run
+        password_hasher._run = run_inline
+        try:
+            await measure(client, "inline")
+        finally:
+            password_hasher._run = offloaded_run
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Checks that 500 concurrent /result calls are served by a pool of
+10 connections while every lookup is still waiting on the external server.
+
+Usage (from the cadastre_api directory):
+    python -m benchmarks.result_pool
+"""
+
+import asyncio
+import time
+
+from benchmarks.harness import PoolSampler, app_client
+from config.config import settings
+
+POOL_SIZE = 10
+CONCURRENCY = 500
+EXTERNAL_DELAY = 5.0
+
+QUERY = {"cadastre_number": "77:01:0004:12", "latitude": "55.75", "longitude": "37.61"}
+
+
+async def main() -> None:
+    settings.external.min_delay = settings.external.max_delay = EXTERNAL_DELAY
+
+    async with app_client(pool_size=POOL_SIZE, pool_timeout=5) as client:
+        ids = [
+            (await client.post("/query", json=QUERY)).json()["id"]
+            for _ in range(CONCURRENCY)
+        ]
+
+        with PoolSampler() as sampler:
+            started = time.perf_counter()
+            responses = await asyncio.gather(
+                *(client.get("/result", params={"query_id": i}) for i in ids)
+            )
+            elapsed = time.perf_counter() - started
+
+    statuses = [response.status_code for response in responses]
+    assert statuses == [200] * CONCURRENCY, set(statuses)
+    assert sampler.max_checked_out <= POOL_SIZE
+    assert elapsed < EXTERNAL_DELAY, elapsed
+    print(
+        f"{CONCURRENCY} concurrent /result calls in {elapsed:.2f}s, "
+        f"max checked-out connections: {sampler.max_checked_out}/{POOL_SIZE}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Maintenance of the monthly partitions of the query table.
+
+create  creates the partitions for the coming months (the application
+        also does this on startup and then daily);
+retire  detaches the partitions older than the retention period,
+        archives them to gzipped CSV files and drops them.
+
+Usage (from the cadastre_api directory):
+    python -m commands.partitions create --months-ahead 3
+    python -m commands.partitions retire --keep-months 12 --archive-dir archive
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from config.config import settings
+from config.database import db_helper
+from queries.partitions import (ensure_partitions, month_start,
+                                retire_partitions)
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.command == "create":
+        created = await ensure_partitions(args.months_ahead)
+        print(f"Created partitions: {', '.join(created) or 'none'}")
+    else:
+        # The current month counts towards the kept months
+        before = month_start(datetime.now(timezone.utc), 1 - args.keep_months)
+        retired = await retire_partitions(
+            before,
+            archive_dir=None if args.detach_only else args.archive_dir,
+            drop=not args.detach_only,
+        )
+        print(
+            f"Retired partitions older than {before:%Y-%m}: "
+            f"{', '.join(retired) or 'none'}"
+        )
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create")
+    create.add_argument(
+        "--months-ahead", type=int, default=settings.partitions.months_ahead
+    )
+    retire = commands.add_parser("retire")
+    retire.add_argument(
+        "--keep-months", type=int, default=settings.partitions.retention_months
+    )
+    retire.add_argument("--archive-dir", default=settings.partitions.archive_dir)
+    retire.add_argument(
+        "--detach-only",
+        action="store_true",
+        help="keep detached partitions as standalone tables",
+    )
+    asyncio.run(main(parser.parse_args()))
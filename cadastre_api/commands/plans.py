@@ -0,0 +1,132 @@
+"""
+Query-plan regression check for the history, results and auth read paths.
+
+Runs EXPLAIN on the statements used by get_history, get_results and
+get_user_by_username against a seeded Postgres database and exits with
+a non-zero status if any of them falls back to a sequential scan on a
+large table, or if a history query limited to a period reads every
+partition of the query table.
+
+Usage (from the cadastre_api directory, after commands.seed):
+    python -m commands.plans
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+from config.database import db_helper
+from queries.models import Query
+from queries.partitions import PARENT_TABLE, list_partitions
+from queries.services import history_statement, results_statement
+from sqlalchemy import Select, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from users.models import User
+from users.services import user_by_username_statement
+
+LARGE_TABLES = ("query", "user")
+PAGE_SIZE = 100
+
+
+def is_large(relation: str | None) -> bool:
+    # Partitions of the query table are named query_<suffix>
+    return relation in LARGE_TABLES or (
+        relation is not None and relation.startswith(f"{PARENT_TABLE}_")
+    )
+
+
+def find_scans(plan: dict) -> list[tuple[str, str]]:
+    """
+    Returns (node type, relation) for every scan of a large table.
+    """
+    scans = []
+    if is_large(plan.get("Relation Name")):
+        scans.append((plan["Node Type"], plan["Relation Name"]))
+    for child in plan.get("Plans", []):
+        scans.extend(find_scans(child))
+    return scans
+
+
+async def build_statements(connection: AsyncConnection) -> dict[str, Select]:
+    """
+    Builds the statements with values taken from the seeded data.
+    """
+    number = await connection.scalar(select(Query.cadastre_number).limit(1))
+    middle_id = await connection.scalar(select(func.max(Query.id) / 2))
+    username = await connection.scalar(select(User.username).limit(1))
+    prefix = number.rsplit(":", 1)[0]
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    return {
+        "history": history_statement(None, None, PAGE_SIZE),
+        "history after cursor": history_statement(None, middle_id, PAGE_SIZE),
+        "history by number": history_statement(number, None, PAGE_SIZE),
+        "history by prefix": history_statement(None, None, PAGE_SIZE, prefix),
+        "history by period": history_statement(None, None, PAGE_SIZE, since=since),
+        "results by ids": results_statement(
+            list(range(int(middle_id), int(middle_id) + PAGE_SIZE)),
+            connection.dialect.name,
+        ),
+        "user by username": user_by_username_statement(username),
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    async with db_helper.engine.connect() as connection:
+        if connection.dialect.name != "postgresql":
+            print("Query plans can only be checked on Postgres")
+            return 2
+
+        for table in LARGE_TABLES:
+            # A partitioned table has no rows of its own: sum its partitions
+            rows = await connection.scalar(
+                text(
+                    "SELECT coalesce(sum(greatest(reltuples, 0)), 0)::bigint "
+                    "FROM pg_class WHERE oid = to_regclass(:table) OR oid IN "
+                    "(SELECT inhrelid FROM pg_inherits "
+                    "WHERE inhparent = to_regclass(:table))"
+                ),
+                {"table": f'"{table}"'},
+            )
+            if rows < args.min_rows:
+                print(
+                    f"Table {table} has about {rows} rows, seed at least "
+                    f"{args.min_rows} for meaningful plans (commands.seed)"
+                )
+                return 2
+
+        partitions = len(await list_partitions(connection))
+        failures = 0
+        for name, stmt in (await build_statements(connection)).items():
+            sql = stmt.compile(
+                dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+            )
+            plan = await connection.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = find_scans(plan[0]["Plan"])
+            problems = [
+                f"sequential scan on {relation}"
+                for node, relation in scans
+                if node == "Seq Scan"
+            ]
+            scanned = {relation for _, relation in scans if relation != "user"}
+            if name == "history by period" and 1 < partitions <= len(scanned):
+                problems.append(f"no partition pruning ({len(scanned)} scanned)")
+            if problems:
+                failures += 1
+                print(f"FAIL {name}: {'; '.join(problems)}")
+                if args.verbose:
+                    print(json.dumps(plan, indent=2))
+            else:
+                print(f"ok   {name}")
+    await db_helper.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--min-rows", type=int, default=100_000)
+    parser.add_argument("--verbose", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,154 @@
+"""
+Bulk-loads synthetic users and cadastre queries for load and plan testing.
+
+Rows are generated in chunks and loaded with COPY on Postgres (batched
+multi-row INSERTs on other databases), so memory stays flat and ten
+million queries load in minutes. Queries without a result get lookup
+jobs, and the result statistics are rebuilt after the load.
+
+Usage (from the cadastre_api directory):
+    python -m commands.seed --queries 10000000 --users 100000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Iterator
+
+from config.database import db_helper
+from queries.geo import encode_geohash
+from queries.models import LookupJob, Query
+from queries.stats import rebuild_stats
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from users.hashing import pwd_context
+from users.models import User
+
+CHUNK_SIZE = 50_000
+QUERY_COLUMNS = (
+    "cadastre_number",
+    "latitude",
+    "longitude",
+    "geohash",
+    "result",
+    "district",
+    "area",
+    "quarter",
+    "parcel",
+)
+USER_COLUMNS = ("username", "email", "is_admin", "hashed_password")
+
+
+def generate_queries(count: int, seed: int) -> Iterator[tuple]:
+    """
+    Generates queries clustered like real ones: a limited set of districts
+    with their own centers, many parcels per cadastral quarter.
+    """
+    rng = random.Random(seed)
+    centers = {
+        district: (rng.uniform(43.0, 68.0), rng.uniform(28.0, 140.0))
+        for district in range(1, 100)
+    }
+    for _ in range(count):
+        district = rng.randint(1, 99)
+        area = rng.randint(1, 60)
+        quarter = rng.randint(1, 20_000)
+        parcel = rng.randint(1, 5_000)
+        center_lat, center_lon = centers[district]
+        latitude = round(center_lat + rng.uniform(-0.5, 0.5), 6)
+        longitude = round(center_lon + rng.uniform(-0.5, 0.5), 6)
+        yield (
+            f"{district:02d}:{area:02d}:{quarter:07d}:{parcel}",
+            latitude,
+            longitude,
+            encode_geohash(latitude, longitude),
+            rng.choice((True, False, True, False, None)),
+            district,
+            area,
+            quarter,
+            parcel,
+        )
+
+
+def generate_users(count: int, offset: int, hashed_password: str) -> Iterator[tuple]:
+    for number in range(offset, offset + count):
+        yield (f"user{number}", f"user{number}@example.com", False, hashed_password)
+
+
+def chunks(rows: Iterator[tuple], size: int) -> Iterator[list[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def load(
+    connection: AsyncConnection, table, columns: tuple[str, ...], rows: Iterator[tuple]
+) -> int:
+    loaded = 0
+    started = time.perf_counter()
+    for chunk in chunks(rows, CHUNK_SIZE):
+        if connection.dialect.name == "postgresql":
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.__tablename__, records=chunk, columns=columns
+            )
+        else:
+            await connection.execute(
+                insert(table), [dict(zip(columns, row)) for row in chunk]
+            )
+            await connection.commit()
+        loaded += len(chunk)
+        rate = loaded / (time.perf_counter() - started)
+        print(f"{table.__tablename__}: {loaded} rows ({rate:.0f} rows/s)")
+    return loaded
+
+
+async def main(args: argparse.Namespace) -> None:
+    async with db_helper.engine.connect() as connection:
+        if args.users:
+            offset = await connection.scalar(text('SELECT count(*) FROM "user"'))
+            hashed_password = pwd_context.hash(args.password)
+            await load(
+                connection,
+                User,
+                USER_COLUMNS,
+                generate_users(args.users, offset, hashed_password),
+            )
+        if args.queries:
+            last_id = await connection.scalar(select(func.max(Query.id))) or 0
+            await load(
+                connection,
+                Query,
+                QUERY_COLUMNS,
+                generate_queries(args.queries, args.seed),
+            )
+            # Queries without a result wait for the lookup worker, as real ones do
+            await connection.execute(
+                insert(LookupJob).from_select(
+                    ["query_id"],
+                    select(Query.id).where(Query.id > last_id, Query.result.is_(None)),
+                )
+            )
+            await connection.commit()
+        if connection.dialect.name == "postgresql":
+            await connection.execute(text('ANALYZE query, "user"'))
+            await connection.commit()
+    if args.queries:
+        quarters = await rebuild_stats()
+        print(f"query_stats: {quarters} quarters")
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--password", default="seed-password")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
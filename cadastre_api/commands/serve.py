@@ -0,0 +1,52 @@
+"""
+Runs the application in production with several worker processes.
+
+Each worker gets its share of DB__MAX_CONNECTIONS and of the cores for
+bcrypt; the metrics of all workers are collected in a shared directory
+(PROMETHEUS_MULTIPROC_DIR, a temporary one if it is not set).
+Run the application through PgBouncer in transaction pooling mode with
+DB__PGBOUNCER=true and DB__LISTEN_URL pointing to Postgres directly.
+
+Usage (from the cadastre_api directory):
+    python -m commands.serve --workers 4
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+
+import uvicorn
+from config.config import settings
+
+
+def prepare_metrics_dir() -> None:
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory is None:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="metrics-")
+        return
+    # Files of a previous run would be added to the new counters
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def main(args: argparse.Namespace) -> None:
+    # Read by the workers, which size their pools from it
+    os.environ["RUN__WORKERS"] = str(args.workers)
+    if args.workers > 1:
+        prepare_metrics_dir()
+    uvicorn.run(
+        "main:main_app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default=settings.run.host)
+    parser.add_argument("--port", type=int, default=settings.run.port)
+    parser.add_argument("--workers", type=int, default=settings.run.workers)
+    main(parser.parse_args())
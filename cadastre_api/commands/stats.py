@@ -0,0 +1,31 @@
+"""
+Rebuilds the per-quarter result statistics from the query table.
+
+The statistics are maintained incrementally as results are written;
+run this to fix drift, for example after manual data changes or from a
+scheduled job. Result writes wait while the rebuild runs.
+
+Usage (from the cadastre_api directory):
+    python -m commands.stats
+"""
+
+import argparse
+import asyncio
+import time
+
+from config.database import db_helper
+from queries.stats import rebuild_stats
+
+
+async def main() -> None:
+    started = time.perf_counter()
+    groups = await rebuild_stats()
+    print(
+        f"Rebuilt statistics for {groups} quarters in {time.perf_counter() - started:.1f}s"
+    )
+    await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__.split("\n\n")[0]).parse_args()
+    asyncio.run(main())
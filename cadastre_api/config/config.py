@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, PostgresDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,6 +10,10 @@ REFRESH_MINUTES = 30
 class RunConfig(BaseModel):
     host: str = "localhost"
     port: int = 8000
+    # Worker processes started by commands.serve; the connection budget
+    # and the bcrypt threads are split between them
+    workers: int = 1
+    reload: bool = False
 
 
 class DatabaseConfig(BaseModel):
@@ -17,6 +23,20 @@ class DatabaseConfig(BaseModel):
     pool_pre_ping: bool = True
     pool_size: int = 50
     max_overflow: int = 10
+    pool_timeout: int = 30
+    # Total connections of all worker processes to each database server;
+    # if set, pool_size and max_overflow are scaled down to fit it,
+    # leaving one connection per worker for LISTEN
+    max_connections: int | None = None
+    # The url points to PgBouncer in transaction pooling mode: PgBouncer
+    # pools the connections, prepared statements are not cached
+    pgbouncer: bool = False
+    # Direct connection to Postgres for LISTEN, which does not work
+    # through PgBouncer in transaction pooling mode
+    listen_url: PostgresDsn | None = None
+    replica_urls: list[PostgresDsn] = []
+    replica_check_interval: float = 5
+    replica_max_lag: float = 10
 
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
@@ -27,9 +47,92 @@ class DatabaseConfig(BaseModel):
     }
 
 
+class WorkerConfig(BaseModel):
+    concurrency: int = 1000
+    batch_size: int = 100
+    # renewed while a lookup runs; how soon jobs of a crashed process
+    # are picked up again
+    lease: float = 300
+    poll_interval: float = 1
+    max_attempts: int = 5
+    retry_delay: float = 10
+
+
+class CoalesceConfig(BaseModel):
+    # Group concurrent POST /query inserts into multi-row transactions
+    enabled: bool = False
+    max_batch: int = 500
+    # seconds to collect inserts while another batch is being written
+    window: float = 0.002
+
+
+class IdempotencyConfig(BaseModel):
+    # seconds an Idempotency-Key of POST /query is honoured
+    ttl: float = 86400
+    cache_size: int = 100_000
+    cache_ttl: float = 300
+    purge_interval: float = 3600
+    purge_batch_size: int = 1000
+
+
+class AdmissionConfig(BaseModel):
+    enabled: bool = True
+    # requests per second per user or address; 0 disables the rate limit
+    rate: float = 0
+    burst: int = 50
+    max_clients: int = 100_000
+    # requests processed at once per route class
+    result_in_flight: int = 500
+    history_in_flight: int = 50
+    export_in_flight: int = 5
+    auth_in_flight: int = 100
+    # shed load once this many checkouts wait for a database connection
+    # or the oldest of them has waited this many seconds
+    pool_max_queue: int = 100
+    pool_max_wait: float = 1
+    retry_after: int = 1
+
+
+class ExternalConfig(BaseModel):
+    client: Literal["emulated", "http"] = "emulated"
+    # emulated
+    min_delay: float = 1
+    max_delay: float = 60
+    # http
+    url: str = "http://localhost:8001"
+    timeout: float = 65
+    connect_timeout: float = 5
+    concurrency: int = 100
+    retries: int = 3
+    backoff: float = 0.5
+    backoff_max: float = 10
+    breaker_threshold: int = 5
+    breaker_reset_timeout: float = 30
+
+
+class CacheConfig(BaseModel):
+    max_size: int = 100_000
+    ttl: int = 3600
+
+
+class HashingConfig(BaseModel):
+    executor: Literal["thread", "process"] = "thread"
+    workers: int | None = None
+    queue_size: int = 100
+
+
+class PartitionConfig(BaseModel):
+    months_ahead: int = 3
+    interval: float = 86400
+    retention_months: int = 12
+    archive_dir: str = "archive"
+
+
 class AuthConfig(BaseModel):
     secret: str
     algorithm: str
+    cache_size: int = 10_000
+    cache_ttl: int = 60
 
 
 class Settings(BaseSettings):
@@ -41,6 +144,14 @@ class Settings(BaseSettings):
     run: RunConfig = RunConfig()
     db: DatabaseConfig
     auth: AuthConfig
+    worker: WorkerConfig = WorkerConfig()
+    coalesce: CoalesceConfig = CoalesceConfig()
+    idempotency: IdempotencyConfig = IdempotencyConfig()
+    admission: AdmissionConfig = AdmissionConfig()
+    external: ExternalConfig = ExternalConfig()
+    cache: CacheConfig = CacheConfig()
+    hashing: HashingConfig = HashingConfig()
+    partitions: PartitionConfig = PartitionConfig()
 
 
 settings = Settings()
@@ -1,8 +1,160 @@
-from typing import AsyncGenerator
+import asyncio
+import itertools
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Sequence
 
 from config.config import settings
+from metrics.pool import InstrumentedPool, instrument_pool
+from sqlalchemy import NullPool, Pool, Select, text
 from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
                                     async_sessionmaker, create_async_engine)
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+    "THEN 0 ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) "
+    "END"
+)
+# PgBouncer in transaction pooling mode may run the next statement
+# on another server connection, where a prepared statement does not exist
+PGBOUNCER_CONNECT_ARGS = {
+    "statement_cache_size": 0,
+    "prepared_statement_cache_size": 0,
+    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+}
+
+
+def pool_limits(
+    pool_size: int, max_overflow: int, max_connections: int | None, workers: int
+) -> tuple[int, int]:
+    """
+    Scales pool_size and max_overflow down, keeping their ratio, so that
+    the pools of all worker processes together open at most
+    max_connections connections. One connection of each worker is left
+    out of its pool for LISTEN.
+    """
+    if max_connections is None:
+        return pool_size, max_overflow
+    per_worker = max(max_connections // max(workers, 1) - 1, 1)
+    if pool_size + max_overflow <= per_worker:
+        return pool_size, max_overflow
+    scaled_size = max(per_worker * pool_size // (pool_size + max_overflow), 1)
+    return scaled_size, per_worker - scaled_size
+
+
+class ReplicaSet:
+    """
+    Read replicas chosen round-robin among the healthy ones.
+    A replica is healthy if it answered the last periodic check
+    and, on Postgres, lags behind the primary by at most max_lag seconds.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[AsyncEngine],
+        check_interval: float = 5,
+        max_lag: float = 10,
+    ):
+        self.engines = list(engines)
+        self.healthy = set(self.engines)
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    def choose(self) -> AsyncEngine | None:
+        healthy = [engine for engine in self.engines if engine in self.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check(self, engine: AsyncEngine) -> bool:
+        try:
+            async with engine.connect() as connection:
+                if engine.dialect.name != "postgresql":
+                    await connection.execute(text("SELECT 1"))
+                    return True
+                lag = await connection.scalar(REPLICA_LAG_QUERY)
+                return lag is not None and lag <= self.max_lag
+        except Exception as exc:
+            logger.warning("Replica %s is unavailable: %r", engine.url, exc)
+            return False
+
+    async def check_all(self) -> None:
+        results = await asyncio.gather(*(self.check(engine) for engine in self.engines))
+        self.healthy = {
+            engine for engine, healthy in zip(self.engines, results) if healthy
+        }
+
+    async def start(self) -> None:
+        if self.engines:
+            await self.check_all()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check_all()
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECT statements to a replica and everything
+    else to the primary. After the first write, and after
+    stick_to_primary(), the session reads from the primary too, so it
+    always sees its own writes.
+    """
+
+    def __init__(self, *args, replicas: ReplicaSet | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.replica: AsyncEngine | None = None
+        self.on_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper, clause=clause, **kwargs)
+        if self.on_primary or self.replicas is None:
+            return primary
+        if self._flushing or not isinstance(clause, Select):
+            self.on_primary = True
+            return primary
+        if self.replica is None:
+            # One replica per session, so that its reads are consistent
+            self.replica = self.replicas.choose()
+        if self.replica is None:
+            return primary
+        return self.replica.sync_engine
+
+    def stick_to_primary(self) -> bool:
+        """
+        Routes the following reads to the primary.
+        Returns False if they were already going there.
+        """
+        switched = not self.on_primary and self.replica is not None
+        self.on_primary = True
+        return switched
+
+
+def stick_to_primary(session: AsyncSession) -> bool:
+    """
+    Switches a read session to the primary, for example to retry a read
+    that a lagging replica could not answer yet. Returns False if the
+    session was already reading from the primary.
+    """
+    sync_session = session.sync_session
+    if isinstance(sync_session, RoutingSession):
+        return sync_session.stick_to_primary()
+    return False
 
 
 class DatabaseHelper:
@@ -14,14 +166,53 @@ class DatabaseHelper:
         pool_pre_ping: bool = True,
         pool_size: int = 50,
         max_overflow: int = 10,
+        pool_timeout: int = 30,
+        poolclass: type[Pool] = InstrumentedPool,
+        name: str = "primary",
+        replica_urls: Sequence[str] = (),
+        replica_check_interval: float = 5,
+        replica_max_lag: float = 10,
+        pgbouncer: bool = False,
+        listen_url: str | None = None,
     ):
-        self.engine: AsyncEngine = create_async_engine(
-            url=url,
-            echo=echo,
-            echo_pool=echo_pool,
-            pool_pre_ping=pool_pre_ping,
-            pool_size=pool_size,
-            max_overflow=max_overflow,
+        if pgbouncer:
+            # Connections are pooled by PgBouncer, not in the process
+            pool_options = {"poolclass": NullPool}
+            connect_args = PGBOUNCER_CONNECT_ARGS
+        else:
+            pool_options = {
+                "poolclass": poolclass,
+                "pool_size": pool_size,
+                "max_overflow": max_overflow,
+                "pool_timeout": pool_timeout,
+            }
+            connect_args = {}
+
+        def create_engine(url: str, name: str) -> AsyncEngine:
+            engine = create_async_engine(
+                url=url,
+                echo=echo,
+                echo_pool=echo_pool,
+                pool_pre_ping=pool_pre_ping,
+                connect_args=connect_args,
+                **pool_options,
+            )
+            instrument_pool(engine.sync_engine.pool, name)
+            return engine
+
+        self.engine: AsyncEngine = create_engine(url, name)
+        # A single long-lived connection: it is not pooled, so that it
+        # does not hold a slot of the main pool for the process lifetime
+        self.listen_engine: AsyncEngine = create_async_engine(
+            listen_url if listen_url is not None else url, poolclass=NullPool
+        )
+        self.replicas = ReplicaSet(
+            [
+                create_engine(replica_url, f"replica{number}")
+                for number, replica_url in enumerate(replica_urls)
+            ],
+            check_interval=replica_check_interval,
+            max_lag=replica_max_lag,
         )
         self.session_factory: async_sessionmaker[AsyncSession] = async_sessionmaker(
             bind=self.engine,
@@ -29,20 +220,68 @@ class DatabaseHelper:
             autocommit=False,
             expire_on_commit=False,
         )
+        self.read_session_factory: async_sessionmaker[AsyncSession] = (
+            async_sessionmaker(
+                bind=self.engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+                sync_session_class=RoutingSession,
+                replicas=self.replicas if self.replicas.engines else None,
+            )
+        )
 
     async def dispose(self) -> None:
+        await self.replicas.stop()
+        for engine in self.replicas.engines:
+            await engine.dispose()
+        await self.listen_engine.dispose()
         await self.engine.dispose()
 
     async def session_getter(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Session on the primary, for routes that write.
+        """
         async with self.session_factory() as session:
             yield session
 
+    async def read_session_getter(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Session that reads from a replica, if replicas are configured,
+        until it writes; for routes that mostly read.
+        """
+        async with self.read_session_factory() as session:
+            yield session
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        """
+        Short unit of work: the connection is checked out for a single
+        transaction and returned to the pool as soon as it commits, so
+        slow work between two transactions does not hold a connection.
+        """
+        async with self.session_factory() as session:
+            async with session.begin():
+                yield session
+
 
+pool_size, max_overflow = pool_limits(
+    settings.db.pool_size,
+    settings.db.max_overflow,
+    settings.db.max_connections,
+    settings.run.workers,
+)
 db_helper = DatabaseHelper(
     url=str(settings.db.url),
     echo=settings.db.echo,
     echo_pool=settings.db.echo_pool,
     pool_pre_ping=settings.db.pool_pre_ping,
-    pool_size=settings.db.pool_size,
-    max_overflow=settings.db.max_overflow,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=settings.db.pool_timeout,
+    replica_urls=[str(url) for url in settings.db.replica_urls],
+    replica_check_interval=settings.db.replica_check_interval,
+    replica_max_lag=settings.db.replica_max_lag,
+    pgbouncer=settings.db.pgbouncer,
+    listen_url=settings.db.listen_url and str(settings.db.listen_url),
 )
@@ -1,28 +1,64 @@
+import os
 from contextlib import asynccontextmanager
 
 import uvicorn
+from admission.middleware import AdmissionMiddleware
 from config.config import settings
 from config.database import db_helper
 from fastapi import FastAPI
+from metrics.collectors import MULTIPROCESS
+from metrics.middleware import MetricsMiddleware
+from metrics.routers import router as metrics_router
+from prometheus_client import multiprocess
+from queries.coalescer import insert_coalescer
+from queries.external import external_client
+from queries.idempotency import idempotency_store
+from queries.notifications import result_broker
+from queries.partitions import partition_maintainer
 from queries.routers import router as queries_router
+from queries.worker import lookup_worker
+from users.hashing import password_hasher
 from users.routers import router as users_router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
+    await db_helper.replicas.start()
+    await partition_maintainer.start()
+    await idempotency_store.start()
+    await external_client.start()
+    await lookup_worker.start()
+    await result_broker.start()
     yield
     # shutdown
+    await insert_coalescer.stop()
+    await result_broker.stop()
+    await lookup_worker.stop()
+    await external_client.close()
+    await idempotency_store.stop()
+    await partition_maintainer.stop()
+    password_hasher.shutdown()
     await db_helper.dispose()
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
 
 
 main_app = FastAPI(title="Cadastre API", lifespan=lifespan)
+# Outermost last: metrics also observe the rejected requests
+main_app.add_middleware(AdmissionMiddleware)
+main_app.add_middleware(MetricsMiddleware)
 
 main_app.include_router(queries_router)
 main_app.include_router(users_router)
+main_app.include_router(metrics_router)
 
 
 if __name__ == "__main__":
+    # For several worker processes use python -m commands.serve
     uvicorn.run(
-        "main:main_app", host=settings.run.host, port=settings.run.port, reload=True
+        "main:main_app",
+        host=settings.run.host,
+        port=settings.run.port,
+        reload=settings.run.reload,
     )
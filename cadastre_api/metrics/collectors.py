@@ -0,0 +1,122 @@
+"""
+Application metrics in the Prometheus text exposition format.
+
+With several worker processes, PROMETHEUS_MULTIPROC_DIR is set by the
+launcher and the metrics of all workers are aggregated at scrape time.
+"""
+
+import os
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+)
+
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool.",
+    ["pool"],
+    buckets=(
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+    ),
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_IDLE = Gauge(
+    "db_pool_idle_connections",
+    "Idle connections held in the pool.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Connections opened above the pool size.",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_CONNECTIONS_OPENED = Counter(
+    "db_pool_connections_opened",
+    "New database connections opened by the pool.",
+    ["pool"],
+)
+POOL_INVALIDATED = Counter(
+    "db_pool_connections_invalidated",
+    "Connections invalidated after an error or a failed ping.",
+    ["pool"],
+)
+
+BCRYPT_SECONDS = Counter(
+    "bcrypt_seconds",
+    "Time spent in bcrypt hashing and verification.",
+    ["operation"],
+)
+BCRYPT_OPERATIONS = Counter(
+    "bcrypt_operations",
+    "Completed bcrypt operations.",
+    ["operation"],
+)
+BCRYPT_REJECTED = Counter(
+    "bcrypt_rejected",
+    "Authentication requests rejected because the hashing queue was full.",
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_requests",
+    "Requests rejected by admission control.",
+    ["route_class", "reason"],
+)
+
+EXTERNAL_DURATION = Histogram(
+    "external_request_duration_seconds",
+    "Duration of requests to the external cadastre server.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120),
+)
+
+
+class CacheCollector:
+    """
+    Exposes the counters of a result cache, read at scrape time.
+    """
+
+    def __init__(self, name: str, cache):
+        self.name = name
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        for key in ("hits", "misses", "coalesced"):
+            yield CounterMetricFamily(
+                f"{self.name}_cache_{key}",
+                f"Cache {key}.",
+                value=stats[key],
+            )
+        for key in ("size", "in_flight"):
+            yield GaugeMetricFamily(
+                f"{self.name}_cache_{key}",
+                f"Cache {key.replace('_', ' ')}.",
+                value=stats[key],
+            )
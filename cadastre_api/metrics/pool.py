@@ -0,0 +1,73 @@
+import time
+from contextvars import ContextVar
+
+from metrics.collectors import (MULTIPROCESS, POOL_CHECKED_OUT,
+                                POOL_CHECKOUT_WAIT, POOL_CONNECTIONS_OPENED,
+                                POOL_IDLE, POOL_INVALIDATED, POOL_OVERFLOW)
+from sqlalchemy import AsyncAdaptedQueuePool, Pool, event
+
+# Set while an API request is being served. Only the checkouts made on its
+# behalf are counted as waiters: the lookup worker and other background jobs
+# queue for connections too, but their backlog is no reason to shed requests.
+request_checkout: ContextVar[bool] = ContextVar("request_checkout", default=False)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that observes how long each checkout waited for a connection
+    and exposes the request checkouts still waiting, for admission control.
+    """
+
+    name = "primary"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Start times of the request checkouts in progress, oldest first
+        self.waiters: dict[object, float] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.waiters)
+
+    def longest_wait(self) -> float:
+        """
+        Seconds the oldest request checkout in progress has been waiting.
+        """
+        if not self.waiters:
+            return 0.0
+        return time.perf_counter() - next(iter(self.waiters.values()))
+
+    def _do_get(self):
+        token = object()
+        started = time.perf_counter()
+        waiting = request_checkout.get()
+        if waiting:
+            self.waiters[token] = started
+        try:
+            return super()._do_get()
+        finally:
+            if waiting:
+                del self.waiters[token]
+            POOL_CHECKOUT_WAIT.labels(self.name).observe(time.perf_counter() - started)
+
+
+def instrument_pool(pool: Pool, name: str) -> None:
+    """
+    Feeds the pool gauges from SQLAlchemy pool events; idle and overflow counts
+    are read from the pool itself at scrape time.
+    """
+    if isinstance(pool, InstrumentedPool):
+        pool.name = name
+    checked_out = POOL_CHECKED_OUT.labels(name)
+    checked_out.set(0)
+    event.listen(pool, "checkout", lambda *args: checked_out.inc())
+    event.listen(pool, "checkin", lambda *args: checked_out.dec())
+    event.listen(
+        pool, "connect", lambda *args: POOL_CONNECTIONS_OPENED.labels(name).inc()
+    )
+    event.listen(pool, "invalidate", lambda *args: POOL_INVALIDATED.labels(name).inc())
+    # A gauge read at scrape time would only show the worker serving
+    # the scrape, so these are not reported with several workers
+    if hasattr(pool, "overflow") and not MULTIPROCESS:
+        POOL_IDLE.labels(name).set_function(pool.checkedin)
+        POOL_OVERFLOW.labels(name).set_function(lambda: max(pool.overflow(), 0))
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Response
+from metrics.collectors import MULTIPROCESS, CacheCollector
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, generate_latest,
+                               multiprocess)
+from queries.cache import result_cache
+
+router = APIRouter(tags=["Metrics"])
+
+if MULTIPROCESS:
+    # Metrics of all worker processes, read from their files on each scrape;
+    # the in-memory cache of a single worker is not reported
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+else:
+    registry = REGISTRY
+    registry.register(CacheCollector("result", result_cache))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Returns the application metrics in the Prometheus text format.
+    """
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
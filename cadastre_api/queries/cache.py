@@ -0,0 +1,73 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from config.cache import TTLCache
+from config.config import settings
+
+
+class ResultCache(TTLCache):
+    """
+    LRU-кэш результатов внешнего сервера с ограниченным временем жизни.
+    Одновременные запросы с одинаковым ключом ожидают один общий
+    запрос на внешний сервер (single-flight).
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 3600):
+        super().__init__(max_size=max_size, ttl=ttl)
+        self.in_flight: dict[Hashable, asyncio.Future[bool]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[bool]]
+    ) -> bool:
+        """
+        Возвращает результат из кэша, присоединяется к уже выполняемому
+        запросу с тем же ключом или выполняет запрос сам.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: отмена одного ожидающего не отменяет общий запрос
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Исключение получат ожидающие, если они есть
+            future.exception()
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self.in_flight[key]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self),
+            "in_flight": len(self.in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+result_cache = ResultCache(
+    max_size=settings.cache.max_size,
+    ttl=settings.cache.ttl,
+)
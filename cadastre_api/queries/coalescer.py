@@ -0,0 +1,78 @@
+import asyncio
+
+from config import db_helper
+from config.config import settings
+from queries.services import insert_queries
+
+
+class InsertCoalescer:
+    """
+    Объединяет вставки запросов из одновременных HTTP-запросов
+    (group commit): значения, накопленные за window секунд или до
+    max_batch строк, сохраняются одним многострочным INSERT ... RETURNING
+    в одной транзакции, и каждый вызывающий получает свой идентификатор.
+
+    Пока ни одна вставка не выполняется, новая отправляется сразу,
+    без ожидания окна, поэтому при низкой нагрузке задержка не растет.
+    """
+
+    def __init__(
+        self, enabled: bool = False, max_batch: int = 500, window: float = 0.002
+    ):
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.window = window
+        self.pending: list[tuple[dict, asyncio.Future]] = []
+        self.flushes: set[asyncio.Task] = set()
+        self.timer: asyncio.TimerHandle | None = None
+
+    async def insert(self, values: dict) -> int:
+        """
+        Сохраняет запрос вместе с заданием и возвращает его идентификатор,
+        когда транзакция, в которую попал запрос, зафиксирована.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((values, future))
+        if not self.flushes or len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        task = asyncio.create_task(self._write(batch))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def stop(self) -> None:
+        self.flush()
+        await asyncio.gather(*self.flushes, return_exceptions=True)
+
+    async def _write(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        try:
+            async with db_helper.transaction() as db:
+                ids = await insert_queries([values for values, _ in batch], db)
+        except Exception as exc:
+            # Ошибка транзакции относится ко всем запросам пакета
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), query_id in zip(batch, ids):
+            # Вызывающий мог уже отменить ожидание
+            if not future.done():
+                future.set_result(query_id)
+
+
+insert_coalescer = InsertCoalescer(
+    enabled=settings.coalesce.enabled,
+    max_batch=settings.coalesce.max_batch,
+    window=settings.coalesce.window,
+)
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+from config.config import ExternalConfig, settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class ExternalServiceError(Exception):
+    """
+    Внешний сервер не вернул результат.
+    """
+
+
+class CircuitOpenError(ExternalServiceError):
+    """
+    Запрос не отправлен: внешний сервер недавно отвечал ошибками.
+    """
+
+
+class ExternalClient(ABC):
+    """
+    Клиент внешнего сервера, проверяющего кадастровый номер и координаты.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def lookup(
+        self, cadastre_number: str, latitude: float, longitude: float
+    ) -> bool:
+        """
+        Возвращает ответ внешнего сервера в виде булевого значения.
+        """
+
+
+class EmulatedClient(ExternalClient):
+    """
+    Эмулирует внешний сервер: ожидает случайное время
+    и возвращает случайный результат.
+    """
+
+    def __init__(self, config: ExternalConfig):
+        self.config = config
+
+    async def lookup(
+        self, cadastre_number: str, latitude: float, longitude: float
+    ) -> bool:
+        # По умолчанию до 60 секунд ожидания
+        await asyncio.sleep(
+            random.uniform(self.config.min_delay, self.config.max_delay)
+        )
+        return random.choice([True, False])
+
+
+class CircuitBreaker:
+    """
+    Размыкается после threshold ошибок подряд и не пропускает запросы
+    reset_timeout секунд; затем пропускает один пробный запрос.
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def release(self) -> None:
+        """
+        Пробный запрос прерван, не дав ответа: следующий запрос
+        снова станет пробным.
+        """
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("External server circuit opened")
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class HTTPClient(ExternalClient):
+    """
+    HTTP-клиент внешнего сервера с общим пулом keep-alive соединений,
+    ограничением одновременных запросов, повторами с джиттером
+    и автоматическим выключателем.
+
+    Протокол: POST {url}/lookup с телом
+    {"cadastre_number": ..., "latitude": ..., "longitude": ...},
+    ответ {"result": true | false}.
+    """
+
+    def __init__(self, config: ExternalConfig):
+        self.config = config
+        self.client: httpx.AsyncClient | None = None
+        self.slots = asyncio.Semaphore(config.concurrency)
+        self.breaker = CircuitBreaker(
+            threshold=config.breaker_threshold,
+            reset_timeout=config.breaker_reset_timeout,
+        )
+
+    async def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            base_url=self.config.url,
+            timeout=httpx.Timeout(
+                self.config.timeout, connect=self.config.connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=self.config.concurrency,
+                max_keepalive_connections=self.config.concurrency,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def backoff(self, attempt: int) -> float:
+        # Полный джиттер: повторы разных запросов не совпадают во времени
+        delay = min(self.config.backoff_max, self.config.backoff * 2**attempt)
+        return random.uniform(0, delay)
+
+    async def lookup(
+        self, cadastre_number: str, latitude: float, longitude: float
+    ) -> bool:
+        payload = {
+            "cadastre_number": cadastre_number,
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+        for attempt in range(self.config.retries + 1):
+            probe = self.breaker.state == "half-open"
+            if not self.breaker.allow():
+                raise CircuitOpenError("External server circuit is open")
+            try:
+                async with self.slots:
+                    response = await self.client.post("/lookup", json=payload)
+            except httpx.TransportError as exc:
+                error = ExternalServiceError(f"External server unavailable: {exc!r}")
+            except asyncio.CancelledError:
+                # Иначе выключатель остался бы разомкнутым навсегда
+                if probe:
+                    self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                if not is_retryable(response.status_code):
+                    # Ответ 4xx тоже означает, что сервер доступен
+                    self.breaker.record_success()
+                    response.raise_for_status()
+                    return bool(response.json()["result"])
+                error = ExternalServiceError(
+                    f"External server responded with {response.status_code}"
+                )
+            self.breaker.record_failure()
+            if attempt < self.config.retries:
+                await asyncio.sleep(self.backoff(attempt))
+        raise error
+
+
+def create_external_client(config: ExternalConfig) -> ExternalClient:
+    if config.client == "http":
+        return HTTPClient(config)
+    return EmulatedClient(config)
+
+
+external_client = create_external_client(settings.external)
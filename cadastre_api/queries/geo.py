@@ -0,0 +1,111 @@
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+EARTH_RADIUS = 6_371_000  # метры
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+MAX_COVER_CELLS = 16
+
+
+def encode_geohash(
+    latitude: float, longitude: float, precision: int = GEOHASH_PRECISION
+) -> str:
+    """
+    Кодирует координаты в geohash заданной длины.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            bounds, coordinate = lon_range, longitude
+        else:
+            bounds, coordinate = lat_range, latitude
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """
+    Возвращает высоту и ширину ячейки geohash в градусах.
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180 / 2**lat_bits, 360 / 2**lon_bits
+
+
+def _frange(start: float, stop: float, step: float) -> list[float]:
+    values = []
+    while start < stop:
+        values.append(start)
+        start += step
+    values.append(stop)
+    return values
+
+
+def cover_bbox(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> list[str]:
+    """
+    Возвращает наименьший набор префиксов geohash (не более MAX_COVER_CELLS),
+    ячейки которого полностью покрывают прямоугольную область.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.ceil((max_lat - min_lat) / height) + 1
+        columns = math.ceil((max_lon - min_lon) / width) + 1
+        if rows * columns > MAX_COVER_CELLS:
+            continue
+        return sorted(
+            {
+                encode_geohash(latitude, longitude, precision)
+                for latitude in _frange(min_lat, max_lat, height)
+                for longitude in _frange(min_lon, max_lon, width)
+            }
+        )
+    return [""]
+
+
+def radius_bboxes(
+    latitude: float, longitude: float, radius: float
+) -> list[tuple[float, float, float, float]]:
+    """
+    Возвращает прямоугольную область, описанную вокруг круга
+    с центром в точке и радиусом в метрах. Область, пересекающая
+    180-й меридиан, делится по нему на две.
+    """
+    delta_lat = radius / METERS_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    delta_lon = 180.0 if cos_lat < 1e-9 else radius / (METERS_PER_DEGREE * cos_lat)
+    min_lat = max(latitude - delta_lat, -90.0)
+    max_lat = min(latitude + delta_lat, 90.0)
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if max_lon - min_lon >= 360.0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    if min_lon < -180.0:
+        return [
+            (min_lat, min_lon + 360.0, max_lat, 180.0),
+            (min_lat, -180.0, max_lat, max_lon),
+        ]
+    if max_lon > 180.0:
+        return [
+            (min_lat, min_lon, max_lat, 180.0),
+            (min_lat, -180.0, max_lat, max_lon - 360.0),
+        ]
+    return [(min_lat, min_lon, max_lat, max_lon)]
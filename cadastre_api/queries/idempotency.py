@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+
+from config import db_helper
+from config.cache import TTLCache
+from config.config import settings
+from fastapi import Depends, HTTPException, Request, status
+from queries.jobs import utcnow
+from queries.models import IdempotencyKey
+from queries.schemas import QueryCreate
+from queries.services import insert_queries
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.ext.asyncio import AsyncSession
+from users.services import optional_oauth2_scheme, token_username
+
+logger = logging.getLogger(__name__)
+
+
+def as_utc(moment: datetime) -> datetime:
+    # SQLite возвращает время без часового пояса
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def request_fingerprint(request: QueryCreate) -> str:
+    return hashlib.sha256(
+        f"{request.cadastre_number}|{request.latitude}|{request.longitude}".encode()
+    ).hexdigest()
+
+
+def client_scope(
+    request: Request, token: str | None = Depends(optional_oauth2_scheme)
+) -> str:
+    """
+    Клиент, в пределах которого уникальны ключи идемпотентности:
+    пользователь действительного токена доступа или адрес клиента.
+    """
+    username = token_username(token) if token else None
+    if username is not None:
+        return f"user:{username}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class IdempotencyStore:
+    """
+    Хранит ключи идемпотентности POST /query (таблица idempotency_key
+    и кэш недавно использованных ключей перед ней), чтобы повтор запроса
+    клиентом, не дождавшимся ответа, вернул уже созданный запрос.
+    Ключи разных клиентов (scope) не пересекаются.
+
+    Истекшие ключи удаляются в фоне пачками.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        cache_size: int = 100_000,
+        cache_ttl: float = 300,
+        purge_interval: float = 3600,
+        purge_batch_size: int = 1000,
+    ):
+        self.ttl = ttl
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self.purge_interval = purge_interval
+        self.purge_batch_size = purge_batch_size
+        self.task: asyncio.Task | None = None
+
+    async def get(
+        self, scope: str, key: str, fingerprint: str, db: AsyncSession
+    ) -> int | None:
+        """
+        Возвращает идентификатор запроса, созданного клиентом scope
+        с ключом key, или None, если ключ не использовался или истек.
+        """
+        entry = self.cache.get((scope, key))
+        if entry is None:
+            now = utcnow()
+            row = (
+                await db.execute(
+                    select(
+                        IdempotencyKey.fingerprint,
+                        IdempotencyKey.query_id,
+                        IdempotencyKey.expires_at,
+                    ).where(
+                        IdempotencyKey.scope == scope,
+                        IdempotencyKey.key == key,
+                        IdempotencyKey.expires_at > now,
+                    )
+                )
+            ).first()
+            if row is None:
+                return None
+            entry = (row.fingerprint, row.query_id)
+            # Ключ не должен пережить в кэше свой срок
+            ttl = (as_utc(row.expires_at) - now).total_seconds()
+            self.cache.set((scope, key), entry, ttl=ttl)
+        stored_fingerprint, query_id = entry
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key has already been used with other parameters",
+            )
+        return query_id
+
+    async def create_query(
+        self,
+        scope: str,
+        key: str,
+        request: QueryCreate,
+        values: dict,
+        db: AsyncSession,
+    ) -> tuple[int, bool]:
+        """
+        Создает запрос с заданием и ключом в одной транзакции или, если
+        ключ уже использован клиентом scope, возвращает ранее созданный
+        запрос. Возвращает идентификатор запроса и признак того, что он создан.
+        """
+        fingerprint = request_fingerprint(request)
+        query_id = await self.get(scope, key, fingerprint, db)
+        if query_id is not None:
+            return query_id, False
+
+        query_id = (await insert_queries([values], db))[0]
+        now = utcnow()
+        stmt = upsert(IdempotencyKey).values(
+            scope=scope,
+            key=key,
+            fingerprint=fingerprint,
+            query_id=query_id,
+            expires_at=now + timedelta(seconds=self.ttl),
+        )
+        # Истекший, но еще не удаленный ключ используется заново
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "query_id": stmt.excluded.query_id,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=IdempotencyKey.expires_at <= now,
+        ).returning(IdempotencyKey.key)
+        if (await db.execute(stmt)).first() is None:
+            # Ключ занят одновременным повтором; Postgres дожидается
+            # фиксации его транзакции, поэтому запрос уже виден
+            await db.rollback()
+            query_id = await self.get(scope, key, fingerprint, db)
+            if query_id is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is in progress",
+                )
+            return query_id, False
+        await db.commit()
+        self.cache.set((scope, key), (fingerprint, query_id), ttl=self.ttl)
+        return query_id, True
+
+    async def purge(self) -> int:
+        """
+        Удаляет истекшие ключи пачками по purge_batch_size строк, каждую
+        в отдельной короткой транзакции, и возвращает число удаленных.
+        """
+        purged = 0
+        while True:
+            expired = (
+                select(IdempotencyKey.scope, IdempotencyKey.key)
+                .where(IdempotencyKey.expires_at <= utcnow())
+                .limit(self.purge_batch_size)
+            )
+            async with db_helper.transaction() as db:
+                result = await db.execute(
+                    delete(IdempotencyKey)
+                    .where(
+                        tuple_(IdempotencyKey.scope, IdempotencyKey.key).in_(expired)
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            purged += result.rowcount
+            if result.rowcount < self.purge_batch_size:
+                return purged
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info("Purged %s expired idempotency keys", purged)
+            except Exception:
+                logger.exception("Could not purge idempotency keys")
+            await asyncio.sleep(self.purge_interval)
+
+
+idempotency_store = IdempotencyStore(
+    ttl=settings.idempotency.ttl,
+    cache_size=settings.idempotency.cache_size,
+    cache_ttl=settings.idempotency.cache_ttl,
+    purge_interval=settings.idempotency.purge_interval,
+    purge_batch_size=settings.idempotency.purge_batch_size,
+)
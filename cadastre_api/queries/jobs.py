@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from config import db_helper
+from queries.models import JobStatus, LookupJob
+from queries.notifications import result_broker
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ACTIVE_STATUSES = (JobStatus.PENDING, JobStatus.RUNNING)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def create_jobs(query_ids: Iterable[int], db: AsyncSession) -> None:
+    """
+    Создает задания для новых запросов в транзакции db,
+    чтобы запрос не мог быть сохранен без задания.
+    """
+    await db.execute(
+        insert(LookupJob), [{"query_id": query_id} for query_id in query_ids]
+    )
+
+
+async def claim_jobs(limit: int, lease: float, max_attempts: int) -> list[int]:
+    """
+    Забирает до limit доступных заданий и арендует их на lease секунд.
+    Задания, заблокированные другими обработчиками, пропускаются
+    (FOR UPDATE SKIP LOCKED), поэтому обработчики не ждут друг друга.
+    Задания, исчерпавшие max_attempts попыток (например, их обработчики
+    каждый раз завершались аварийно), помечаются неудавшимися.
+    """
+    now = utcnow()
+    available = (
+        select(LookupJob.query_id)
+        .where(
+            LookupJob.status.in_(ACTIVE_STATUSES),
+            or_(LookupJob.leased_until.is_(None), LookupJob.leased_until < now),
+        )
+        .with_for_update(skip_locked=True)
+    )
+    exhausted = available.where(LookupJob.attempts >= max_attempts)
+    claimable = (
+        available.where(LookupJob.attempts < max_attempts)
+        .order_by(LookupJob.query_id)
+        .limit(limit)
+    )
+    async with db_helper.transaction() as db:
+        failed = list(
+            await db.scalars(
+                update(LookupJob)
+                .where(LookupJob.query_id.in_(exhausted.scalar_subquery()))
+                .values(status=JobStatus.FAILED, leased_until=None)
+                .returning(LookupJob.query_id)
+                .execution_options(synchronize_session=False)
+            )
+        )
+        await notify_failed(db, failed)
+        result = await db.scalars(
+            update(LookupJob)
+            .where(LookupJob.query_id.in_(claimable.scalar_subquery()))
+            .values(
+                status=JobStatus.RUNNING,
+                attempts=LookupJob.attempts + 1,
+                leased_until=now + timedelta(seconds=lease),
+            )
+            .returning(LookupJob.query_id)
+            .execution_options(synchronize_session=False)
+        )
+        claimed = sorted(result)
+    publish_failed(failed)
+    return claimed
+
+
+async def renew_jobs(query_ids: Iterable[int], lease: float) -> None:
+    """
+    Продлевает аренду заданий, которые еще выполняются, чтобы
+    их не забрал повторно другой обработчик.
+    """
+    query_ids = list(query_ids)
+    if not query_ids:
+        return
+    async with db_helper.transaction() as db:
+        await db.execute(
+            update(LookupJob)
+            .where(
+                LookupJob.query_id.in_(query_ids),
+                LookupJob.status == JobStatus.RUNNING,
+            )
+            .values(leased_until=utcnow() + timedelta(seconds=lease))
+        )
+
+
+async def notify_failed(db: AsyncSession, query_ids: Iterable[int]) -> None:
+    """
+    Сообщает другим процессам о запросах, результат которых не будет
+    получен, чтобы их ожидание завершилось (после фиксации транзакции db).
+    """
+    for query_id in query_ids:
+        await result_broker.notify(db, query_id, None)
+
+
+def publish_failed(query_ids: Iterable[int]) -> None:
+    for query_id in query_ids:
+        result_broker.publish(query_id, None)
+
+
+async def complete_job(query_id: int, db: AsyncSession) -> None:
+    """
+    Удаляет выполненное задание: результат хранится в самом запросе,
+    а таблица заданий не растет вместе с таблицей запросов.
+    """
+    await db.execute(delete(LookupJob).where(LookupJob.query_id == query_id))
+
+
+async def retry_job(query_id: int, max_attempts: int, delay: float) -> None:
+    """
+    Возвращает задание в очередь после неудачной попытки с задержкой,
+    растущей с числом попыток, или помечает его неудавшимся.
+    """
+    async with db_helper.transaction() as db:
+        attempts = await db.scalar(
+            select(LookupJob.attempts).where(LookupJob.query_id == query_id)
+        )
+        if attempts is None:
+            return
+        failed = attempts >= max_attempts
+        if failed:
+            values = {"status": JobStatus.FAILED, "leased_until": None}
+            await notify_failed(db, [query_id])
+        else:
+            values = {
+                "status": JobStatus.PENDING,
+                "leased_until": utcnow() + timedelta(seconds=delay * attempts),
+            }
+        await db.execute(
+            update(LookupJob).where(LookupJob.query_id == query_id).values(**values)
+        )
+    if failed:
+        publish_failed([query_id])
+
+
+async def release_jobs(query_ids: Iterable[int]) -> None:
+    """
+    Снимает аренду с заданий, чтобы их сразу забрали другие
+    обработчики (при остановке процесса).
+    """
+    query_ids = list(query_ids)
+    if not query_ids:
+        return
+    async with db_helper.transaction() as db:
+        await db.execute(
+            update(LookupJob)
+            .where(
+                LookupJob.query_id.in_(query_ids),
+                LookupJob.status == JobStatus.RUNNING,
+            )
+            .values(status=JobStatus.PENDING, leased_until=None)
+        )
@@ -1,6 +1,10 @@
+import enum
+from datetime import datetime
 from typing import Optional
 
 from config.base import Base
+from queries.geo import GEOHASH_PRECISION
+from sqlalchemy import DateTime, Enum, Index, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -9,8 +13,121 @@ class Query(Base):
     Модель запроса для отображения в базе данных.
     """
 
+    __table_args__ = (
+        Index("ix_query_cadastre_number_id", "cadastre_number", "id"),
+        Index("ix_query_cadastre_parts", "district", "area", "quarter", "parcel"),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     cadastre_number: Mapped[str]
-    latitude: Mapped[str]
-    longitude: Mapped[str]
+    latitude: Mapped[float]
+    longitude: Mapped[float]
     result: Mapped[Optional[bool]]
+
+    # Ячейка сетки geohash для поиска по области и радиусу;
+    # сравнение побайтовое, чтобы индекс работал для поиска по префиксу
+    geohash: Mapped[str] = mapped_column(
+        String(GEOHASH_PRECISION).with_variant(
+            String(GEOHASH_PRECISION, collation="C"), "postgresql"
+        ),
+        index=True,
+    )
+
+    # Составные части кадастрового номера (округ:район:квартал:участок)
+    district: Mapped[Optional[int]]
+    area: Mapped[Optional[int]]
+    quarter: Mapped[Optional[int]]
+    parcel: Mapped[Optional[int]]
+
+    # На Postgres таблица секционирована по месяцам created_at,
+    # и первичный ключ в базе - (id, created_at); id по-прежнему
+    # уникален, так как берется из одной последовательности
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    # Больше не записывается: выполненные задания удаляются
+    DONE = "done"
+    FAILED = "failed"
+
+
+class LookupJob(Base):
+    """
+    Задание на запрос к внешнему серверу для запроса query_id.
+
+    Обработчики забирают задания пачками (FOR UPDATE SKIP LOCKED)
+    и арендуют их до leased_until; задание с истекшей арендой
+    снова становится доступным, например после падения процесса.
+    У ожидающего повтора задания leased_until - время, раньше
+    которого его не следует забирать. Выполненные задания удаляются;
+    неудавшиеся остаются, пока существует их запрос.
+    """
+
+    __tablename__ = "lookup_job"
+    __table_args__ = (
+        Index(
+            "ix_lookup_job_active",
+            "query_id",
+            postgresql_where=text("status IN ('pending', 'running')"),
+        ),
+    )
+
+    # Без внешнего ключа: таблица запросов может быть секционирована
+    query_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    status: Mapped[JobStatus] = mapped_column(
+        Enum(
+            JobStatus,
+            native_enum=False,
+            length=16,
+            values_callable=lambda statuses: [status.value for status in statuses],
+        ),
+        default=JobStatus.PENDING,
+        server_default=JobStatus.PENDING.value,
+    )
+    attempts: Mapped[int] = mapped_column(default=0, server_default="0")
+    leased_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class QueryStats(Base):
+    """
+    Число полученных результатов по кадастровым кварталам.
+    Обновляется при записи каждого результата, поэтому статистика
+    читается за время, пропорциональное числу кварталов, а не запросов.
+    """
+
+    __tablename__ = "query_stats"
+
+    district: Mapped[int] = mapped_column(primary_key=True)
+    area: Mapped[int] = mapped_column(primary_key=True)
+    quarter: Mapped[int] = mapped_column(primary_key=True)
+    true_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    false_count: Mapped[int] = mapped_column(default=0, server_default="0")
+
+
+class IdempotencyKey(Base):
+    """
+    Ключ идемпотентности POST /query и идентификатор запроса,
+    созданного с этим ключом: повтор тем же клиентом с тем же ключом
+    до expires_at возвращает тот же идентификатор, не создавая новый запрос.
+    """
+
+    __tablename__ = "idempotency_key"
+
+    # Клиент, которому принадлежит ключ: пользователь или адрес
+    scope: Mapped[str] = mapped_column(String(255), primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Хэш параметров запроса: ключ нельзя повторно использовать с другими
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    query_id: Mapped[int]
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import uuid
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from config import db_helper
+from config.config import settings
+from queries.models import JobStatus, LookupJob, Query
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "query_result"
+# Проверка соединения LISTEN: обрыв без закрытия TCP-соединения
+# иначе не заметен
+CHECK_INTERVAL = 30
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+PAYLOAD_RESULTS = {True: "1", False: "0", None: "-"}
+NOTIFIED_RESULTS = {value: result for result, value in PAYLOAD_RESULTS.items()}
+
+
+class ResultBroker:
+    """
+    Рассылает подписчикам результаты запросов, как только они записаны.
+
+    Внутри процесса результаты передаются напрямую; на Postgres они
+    также отправляются через NOTIFY в транзакции записи, чтобы их
+    получили подписчики других процессов (через LISTEN). Оборванное
+    соединение LISTEN восстанавливается в фоне.
+    """
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        # Уведомления собственного процесса отбрасываются по этой метке
+        self.token = uuid.uuid4().hex
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+        self.connection: AsyncConnection | None = None
+        self.task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if db_helper.listen_engine.dialect.name != "postgresql":
+            return
+        if settings.db.pgbouncer and settings.db.listen_url is None:
+            logger.warning(
+                "LISTEN does not work through PgBouncer in transaction pooling "
+                "mode: set DB__LISTEN_URL to receive results of other processes"
+            )
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.disconnect()
+
+    async def listen(self) -> asyncio.Event:
+        """
+        Подключается к каналу; возвращает событие, которое
+        устанавливается при обрыве соединения.
+        """
+        lost = asyncio.Event()
+        self.connection = await db_helper.listen_engine.connect()
+        raw = await self.connection.get_raw_connection()
+        raw.driver_connection.add_termination_listener(lambda connection: lost.set())
+        await raw.driver_connection.add_listener(self.channel, self._on_notify)
+        return lost
+
+    async def disconnect(self) -> None:
+        if self.connection is None:
+            return
+        try:
+            await self.connection.close()
+        except Exception:
+            logger.debug("Could not close the LISTEN connection", exc_info=True)
+        self.connection = None
+
+    async def recheck(self) -> None:
+        """
+        Перечитывает результаты ожидаемых запросов: уведомления,
+        отправленные без соединения LISTEN, потеряны.
+        """
+        query_ids = list(self.subscribers)
+        if not query_ids:
+            return
+        async with db_helper.transaction() as db:
+            rows = (
+                await db.execute(
+                    select(Query.id, Query.result)
+                    .outerjoin(LookupJob, LookupJob.query_id == Query.id)
+                    .where(
+                        Query.id.in_(query_ids),
+                        or_(
+                            Query.result.is_not(None),
+                            LookupJob.status == JobStatus.FAILED,
+                        ),
+                    )
+                )
+            ).all()
+        for query_id, result in rows:
+            self.publish(query_id, result)
+
+    async def _run(self) -> None:
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                lost = await self.listen()
+                await self.recheck()
+                delay = RECONNECT_DELAY
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), CHECK_INTERVAL)
+                    except asyncio.TimeoutError:
+                        raw = await self.connection.get_raw_connection()
+                        await raw.driver_connection.fetchval(
+                            "SELECT 1", timeout=CHECK_INTERVAL
+                        )
+                logger.warning("Lost the connection listening for query results")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not listen for query results")
+            await self.disconnect()
+            logger.warning("Listening for query results again in %s s", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    @contextmanager
+    def subscribe(self, query_ids: Iterable[int]) -> Iterator[asyncio.Queue]:
+        """
+        Подписывает очередь на результаты запросов с указанными
+        идентификаторами; в очередь попадают пары (id, результат).
+        """
+        queue: asyncio.Queue[tuple[int, bool]] = asyncio.Queue()
+        query_ids = set(query_ids)
+        for query_id in query_ids:
+            self.subscribers.setdefault(query_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            for query_id in query_ids:
+                queues = self.subscribers.get(query_id)
+                if queues is not None:
+                    queues.discard(queue)
+                    if not queues:
+                        del self.subscribers[query_id]
+
+    def publish(self, query_id: int, result: bool | None) -> None:
+        """
+        Передает подписчикам результат запроса; None - результат
+        не будет получен (задание исчерпало попытки).
+        """
+        for queue in self.subscribers.get(query_id, ()):
+            queue.put_nowait((query_id, result))
+
+    async def notify(
+        self, db: AsyncSession, query_id: int, result: bool | None
+    ) -> None:
+        """
+        Отправляет уведомление другим процессам; оно будет доставлено
+        после фиксации транзакции db.
+        """
+        if db.bind.dialect.name == "postgresql":
+            payload = f"{query_id}:{PAYLOAD_RESULTS[result]}:{self.token}"
+            await db.execute(select(func.pg_notify(self.channel, payload)))
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        query_id, result, token = payload.split(":")
+        if token != self.token:
+            self.publish(int(query_id), NOTIFIED_RESULTS[result])
+
+
+result_broker = ResultBroker()
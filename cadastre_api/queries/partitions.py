@@ -0,0 +1,212 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from config import db_helper
+from config.config import settings
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "query"
+PARTITION_PREFIX = "query_p"
+# Произвольный ключ блокировки: создание секций несколькими
+# процессами одновременно выполняется по очереди
+PARTITIONS_LOCK = 7_301_942
+BOUND_PATTERN = re.compile(r"TO \('([^']+)'\)")
+# Таблицы без внешнего ключа на запросы: их строки удаляются
+# вместе с секцией, к запросам которой они относятся
+DEPENDENT_TABLES = ("lookup_job", "idempotency_key")
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    """
+    Возвращает начало месяца (UTC), отстоящего от moment на offset месяцев.
+    """
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARTITION_PREFIX}{start:%Y_%m}"
+
+
+@dataclass
+class Partition:
+    name: str
+    # Верхняя граница (не включительно); None для MAXVALUE
+    upper: datetime | None
+
+
+async def is_partitioned(connection: AsyncConnection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return bool(
+        await connection.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass(:table))"
+            ),
+            {"table": PARENT_TABLE},
+        )
+    )
+
+
+async def list_partitions(connection: AsyncConnection) -> list[Partition]:
+    # Границы секций выводятся в часовом поясе сеанса
+    await connection.execute(text("SET LOCAL TimeZone = 'UTC'"))
+    rows = await connection.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": PARENT_TABLE},
+    )
+    partitions = []
+    for name, bound in rows:
+        match = BOUND_PATTERN.search(bound)
+        upper = datetime.fromisoformat(match.group(1)) if match else None
+        partitions.append(Partition(name, upper))
+    return partitions
+
+
+async def ensure_partitions(months_ahead: int = 3) -> list[str]:
+    """
+    Создает недостающие месячные секции таблицы запросов от последней
+    существующей до months_ahead месяцев вперед. Возвращает имена
+    созданных секций.
+    """
+    created = []
+    async with db_helper.engine.connect() as connection:
+        if not await is_partitioned(connection):
+            return created
+        async with connection.begin():
+            await connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITIONS_LOCK}
+            )
+            partitions = await list_partitions(connection)
+            now = datetime.now(timezone.utc)
+            start = max(
+                (partition.upper for partition in partitions if partition.upper),
+                default=month_start(now),
+            )
+            while start < month_start(now, months_ahead + 1):
+                end = month_start(start, 1)
+                name = partition_name(start)
+                await connection.execute(
+                    text(
+                        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                        f"FOR VALUES FROM ('{start.isoformat()}') "
+                        f"TO ('{end.isoformat()}')"
+                    )
+                )
+                created.append(name)
+                start = end
+    for name in created:
+        logger.info("Created partition %s", name)
+    return created
+
+
+async def archive_partition(name: str, directory: str) -> str:
+    """
+    Выгружает отсоединенную секцию в сжатый CSV-файл и возвращает путь к нему.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+    async with db_helper.engine.connect() as connection:
+        raw = await connection.get_raw_connection()
+        with gzip.open(path, "wb") as file:
+
+            async def write(chunk: bytes) -> None:
+                file.write(chunk)
+
+            await raw.driver_connection.copy_from_table(
+                name, output=write, format="csv", header=True
+            )
+    return path
+
+
+async def retire_partitions(
+    before: datetime, archive_dir: str | None = None, drop: bool = False
+) -> list[str]:
+    """
+    Отсоединяет секции, все строки которых созданы раньше before.
+    Секция выгружается в archive_dir, если он указан, и удаляется,
+    если drop; иначе остается отдельной таблицей. Задания и ключи
+    идемпотентности запросов секции удаляются в любом случае.
+    """
+    retired = []
+    async with db_helper.engine.connect() as connection:
+        if not await is_partitioned(connection):
+            return retired
+        partitions = await list_partitions(connection)
+        await connection.commit()
+        # DETACH ... CONCURRENTLY не блокирует чтение и запись в таблицу,
+        # но не может выполняться внутри транзакции
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for partition in partitions:
+            if partition.upper is None or partition.upper > before:
+                continue
+            await connection.execute(
+                text(
+                    f"ALTER TABLE {PARENT_TABLE} "
+                    f"DETACH PARTITION {partition.name} CONCURRENTLY"
+                )
+            )
+            logger.info("Detached partition %s", partition.name)
+            if archive_dir is not None:
+                path = await archive_partition(partition.name, archive_dir)
+                logger.info("Archived partition %s to %s", partition.name, path)
+            for table in DEPENDENT_TABLES:
+                await connection.execute(
+                    text(
+                        f"DELETE FROM {table} WHERE query_id IN "
+                        f"(SELECT id FROM {partition.name})"
+                    )
+                )
+            if drop:
+                await connection.execute(text(f"DROP TABLE {partition.name}"))
+                logger.info("Dropped partition %s", partition.name)
+            retired.append(partition.name)
+    return retired
+
+
+class PartitionMaintainer:
+    """
+    Периодически создает секции таблицы запросов на месяцы вперед,
+    чтобы вставка не завершилась ошибкой при смене месяца.
+    """
+
+    def __init__(self, months_ahead: int = 3, interval: float = 86400):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self.task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await ensure_partitions(self.months_ahead)
+            except Exception:
+                logger.exception("Could not create query partitions")
+            await asyncio.sleep(self.interval)
+
+
+partition_maintainer = PartitionMaintainer(
+    months_ahead=settings.partitions.months_ahead,
+    interval=settings.partitions.interval,
+)
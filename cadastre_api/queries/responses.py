@@ -0,0 +1,14 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-ответ, сериализуемый orjson сразу в байты, без jsonable_encoder.
+
+    Содержимое должно состоять из словарей, списков, чисел, строк
+    и дат; даты в UTC записываются с "Z", как это делает pydantic.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
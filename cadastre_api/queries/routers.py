@@ -1,16 +1,51 @@
 import asyncio
-import random
+import json
+from datetime import datetime
+from typing import AsyncIterator
 
 from config import db_helper
-from fastapi import APIRouter, Depends, HTTPException, status
-from queries.models import Query
-from queries.schemas import QueryCreate, QueryResponse, ResultResponse
-from sqlalchemy import select
+from config.database import stick_to_primary
+from fastapi import APIRouter, Body, Depends, Header, HTTPException
+from fastapi import Query as QueryParam
+from fastapi import Response, status
+from fastapi.responses import StreamingResponse
+from queries.cache import result_cache
+from queries.coalescer import insert_coalescer
+from queries.idempotency import client_scope, idempotency_store
+from queries.jobs import create_jobs
+from queries.models import JobStatus, Query
+from queries.notifications import result_broker
+from queries.responses import FastJSONResponse
+from queries.schemas import (CADASTRE_PREFIX_PATTERN, ExportFormat,
+                             HistoryResponse, NearbyQueryRead, NearbyResponse,
+                             QueryBatchResponse, QueryCreate, QueryRead,
+                             QueryResponse, QueryStatus, ResultItem,
+                             ResultResponse, ResultsResponse, StatsItem,
+                             StatsResponse)
+from queries.services import (create_queries, export_history, get_bbox_page,
+                              get_history_rows, get_nearby, get_results,
+                              query_values, result_response, results_statement)
+from queries.stats import get_stats
+from queries.worker import lookup_worker
 from sqlalchemy.ext.asyncio import AsyncSession
-from users.services import oauth2_scheme
+from users.models import User
+from users.services import get_current_user
 
 router = APIRouter(tags=["Queries"])
 
+BATCH_MAX_SIZE = 10_000
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+NEARBY_MAX_RADIUS = 100_000  # метры
+STREAM_MAX_IDS = 1000
+STREAM_HEARTBEAT = 15  # секунды
+RESULTS_MAX_IDS = 1000
+RESULTS_MAX_WAIT = 60  # секунды
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
 
 @router.get("/ping")
 async def ping():
@@ -21,78 +56,344 @@ async def ping():
     return {"message": "Server is up!"}
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Возвращает счетчики кэша результатов внешнего сервера:
+    попадания, промахи и запросы, объединенные с уже выполняемыми.
+    """
+    return result_cache.stats()
+
+
 @router.post("/query", response_model=QueryResponse)
 async def send_query(
-    request: QueryCreate, db: AsyncSession = Depends(db_helper.session_getter)
+    request: QueryCreate,
+    response: Response,
+    db: AsyncSession = Depends(db_helper.session_getter),
+    idempotency_key: str | None = Header(default=None, min_length=1, max_length=255),
+    scope: str = Depends(client_scope),
 ):
     """
-    Сохраняет в базу данных параметры запроса
-    и возвращает идентификатор запроса.
+    Сохраняет в базу данных параметры запроса, ставит его
+    в очередь на обработку и возвращает идентификатор запроса.
+
+    Повтор с тем же заголовком Idempotency-Key возвращает идентификатор
+    уже созданного запроса, не создавая новый. Ключи уникальны в пределах
+    пользователя (по токену доступа) или, без токена, адреса клиента.
     """
-    new_query = Query(
-        cadastre_number=request.cadastre_number,
-        latitude=request.latitude,
-        longitude=request.longitude,
-        result=None,
-    )
-    db.add(new_query)
-    await db.commit()
-    await db.refresh(new_query)
+    if idempotency_key is not None:
+        query_id, created = await idempotency_store.create_query(
+            scope, idempotency_key, request, query_values(request), db
+        )
+        if not created:
+            response.headers["Idempotent-Replayed"] = "true"
+            return QueryResponse(id=query_id)
+    elif insert_coalescer.enabled:
+        query_id = await insert_coalescer.insert(query_values(request))
+    else:
+        new_query = Query(**query_values(request))
+        db.add(new_query)
+        await db.flush()
+        await create_jobs([new_query.id], db)
+        await db.commit()
+        query_id = new_query.id
+    lookup_worker.wake()
 
-    return QueryResponse(id=new_query.id)
+    return QueryResponse(id=query_id)
+
+
+@router.post("/query/batch", response_model=QueryBatchResponse)
+async def send_queries(
+    requests: list[QueryCreate] = Body(min_length=1, max_length=BATCH_MAX_SIZE),
+    db: AsyncSession = Depends(db_helper.session_getter),
+):
+    """
+    Сохраняет в базу данных пакет запросов, ставит их в очередь
+    на обработку и возвращает идентификаторы в порядке запросов.
+    """
+    ids = await create_queries(requests, db)
+    lookup_worker.wake()
+
+    return QueryBatchResponse(ids=ids)
 
 
 @router.get("/result", response_model=ResultResponse)
 async def get_result(
-    query_id: int, db: AsyncSession = Depends(db_helper.session_getter)
+    query_id: int, db: AsyncSession = Depends(db_helper.read_session_getter)
 ):
     """
-    Эмулирует запрос на сервер по идентификатору
-    и возвращает результат в виде булевого значения.
+    Возвращает статус запроса по идентификатору
+    и результат в виде булевого значения, если он уже получен.
     """
-    query = await db.get(Query, query_id)
+    stmt = results_statement([query_id], db.bind.dialect.name)
+    row = (await db.execute(stmt)).first()
+    if row is None and stick_to_primary(db):
+        # Только что созданный запрос мог еще не дойти до реплики
+        row = (await db.execute(stmt)).first()
 
-    if not query:
+    if row is None:
         # Если запрос не найден, выдаем код 404
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Query not found"
         )
 
-    # Эмуляция запроса на внешний сервер
-    await asyncio.sleep(random.randint(1, 60))  # До 60 секунд ожидания
+    return result_response(row.result, row.status == JobStatus.FAILED)
+
+
+def is_pending(results: dict[int, ResultResponse]) -> set[int]:
+    return {
+        query_id
+        for query_id, result in results.items()
+        if result.status == QueryStatus.PENDING
+    }
+
+
+async def refresh_pending(pending: set[int], queue: asyncio.Queue) -> None:
+    """
+    Результат мог быть записан до подписки: перечитывает ожидающие
+    запросы уже после нее и передает полученные в очередь.
+    """
+    for query_id, result in (await get_results(pending)).items():
+        if result.status != QueryStatus.PENDING:
+            queue.put_nowait((query_id, result.result))
+
+
+async def wait_for_results(results: dict[int, ResultResponse], timeout: float) -> None:
+    """
+    Дописывает в results результаты ожидающих запросов по мере их
+    получения, пока не получены все или не истекли timeout секунд.
+    Соединение с БД на время ожидания не занимается.
+    """
+    pending = is_pending(results)
+    if not pending:
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with result_broker.subscribe(pending) as queue:
+        await refresh_pending(pending, queue)
+
+        while pending:
+            try:
+                query_id, result = await asyncio.wait_for(
+                    queue.get(), max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                return
+            if query_id in pending:
+                pending.discard(query_id)
+                # Без результата уведомляют только о неудавшихся запросах
+                results[query_id] = result_response(result, failed=True)
+
+
+@router.get("/results", response_model=ResultsResponse)
+async def get_results_batch(
+    query_id: list[int] = QueryParam(min_length=1, max_length=RESULTS_MAX_IDS),
+    wait: float = QueryParam(default=0, ge=0, le=RESULTS_MAX_WAIT),
+):
+    """
+    Возвращает статусы и результаты нескольких запросов одним
+    обращением к базе данных. Если указан wait, ответ задерживается
+    до получения результатов всех запросов, но не более чем на wait секунд.
+    """
+    # Порядок ответа совпадает с порядком идентификаторов, без повторов
+    query_ids = list(dict.fromkeys(query_id))
+    results = await get_results(query_ids)
+    if wait:
+        await wait_for_results(results, wait)
+
+    items = []
+    missing = []
+    for query_id in query_ids:
+        if query_id not in results:
+            missing.append(query_id)
+        else:
+            items.append(ResultItem(id=query_id, **results[query_id].model_dump()))
+    return ResultsResponse(items=items, missing=missing)
+
+
+def result_event(query_id: int, result: ResultResponse) -> str:
+    data = json.dumps(
+        {"query_id": query_id, "status": result.status.value, "result": result.result}
+    )
+    return f"event: result\ndata: {data}\n\n"
+
+
+async def result_events(results: dict[int, ResultResponse]) -> AsyncIterator[str]:
+    pending = is_pending(results)
+    for query_id, result in results.items():
+        if query_id not in pending:
+            yield result_event(query_id, result)
+    if not pending:
+        return
+
+    with result_broker.subscribe(pending) as queue:
+        await refresh_pending(pending, queue)
+
+        while pending:
+            try:
+                query_id, result = await asyncio.wait_for(
+                    queue.get(), timeout=STREAM_HEARTBEAT
+                )
+            except asyncio.TimeoutError:
+                # Комментарий не дает прокси закрыть простаивающее соединение
+                yield ": keep-alive\n\n"
+                continue
+            if query_id in pending:
+                pending.discard(query_id)
+                yield result_event(query_id, result_response(result, failed=True))
 
-    if query.result is None:
-        # Если результат еще не определен, эмулируем его получение
-        query.result = random.choice([True, False])
-        await db.commit()
-        await db.refresh(query)
 
-    return ResultResponse(result=query.result)
+@router.get("/result/stream")
+async def stream_results(
+    query_id: list[int] = QueryParam(min_length=1, max_length=STREAM_MAX_IDS),
+):
+    """
+    Передает результаты одного или нескольких запросов (server-sent
+    events) по мере их получения, без опроса /result.
+    Поток закрывается, когда получены результаты всех запросов.
+    """
+    results = await get_results(set(query_id))
+    if len(results) < len(set(query_id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Query not found"
+        )
+    return StreamingResponse(
+        result_events(results),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", response_model=StatsResponse)
+async def get_query_stats(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(db_helper.read_session_getter),
+    district: int | None = QueryParam(default=None, ge=0),
+):
+    """
+    Возвращает число положительных и отрицательных результатов
+    и их долю по кадастровым округам или, если указан округ,
+    по кварталам этого округа.
+    """
+    items = []
+    for row in await get_stats(db, district):
+        total = row["true_count"] + row["false_count"]
+        items.append(
+            StatsItem(
+                **row,
+                total=total,
+                true_ratio=row["true_count"] / total if total else None,
+            )
+        )
+    return StatsResponse(items=items)
 
 
-@router.get("/history")
+@router.get("/history", response_model=HistoryResponse)
 async def get_history(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(db_helper.session_getter),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(db_helper.read_session_getter),
     number: str | None = None,
+    after: int | None = None,
+    limit: int = QueryParam(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    prefix: str | None = QueryParam(default=None, pattern=CADASTRE_PREFIX_PATTERN),
+    since: datetime | None = None,
+    until: datetime | None = None,
 ):
     """
-    Получает историю запросов по кадастровому номеру
-    или историю всех запросов, если кадастровый номер не указан.
+    Получает страницу истории запросов по кадастровому номеру
+    или его префиксу (округ, район, квартал) или истории всех запросов,
+    если кадастровый номер не указан; since и until ограничивают
+    период создания запросов.
+    Следующая страница запрашивается с after=next_cursor.
     """
-    if number is None:
-        # История всех запросов
-        result = await db.execute(select(Query))
-        history = result.scalars().all()
-    else:
-        # История запросов по кадастровому номеру
-        result = await db.execute(select(Query).where(Query.cadastre_number == number))
-        history = result.scalars().all()
-
-        if not history:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="History not found for the given cadastre number",
+    # Строки сериализуются напрямую, минуя проверку по response_model:
+    # она нужна только для описания ответа в OpenAPI
+    history, next_cursor = await get_history_rows(
+        db, number, after, limit, prefix, since, until
+    )
+
+    if (number is not None or prefix is not None) and after is None and not history:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="History not found for the given cadastre number",
+        )
+
+    return FastJSONResponse({"items": history, "next_cursor": next_cursor})
+
+
+@router.get("/history/export")
+async def get_history_export(
+    user: User = Depends(get_current_user),
+    number: str | None = None,
+    prefix: str | None = QueryParam(default=None, pattern=CADASTRE_PREFIX_PATTERN),
+    export_format: ExportFormat = QueryParam(
+        default=ExportFormat.NDJSON, alias="format"
+    ),
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """
+    Потоково выгружает историю запросов в формате NDJSON или CSV
+    по кадастровому номеру или всю историю, если номер не указан,
+    за период [since, until), если он задан.
+    """
+    return StreamingResponse(
+        export_history(number, export_format, prefix, since, until),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="history.{export_format.value}"'
             )
+        },
+    )
 
-    return history
+
+@router.get("/history/bbox", response_model=HistoryResponse)
+async def get_history_bbox(
+    min_lat: float = QueryParam(ge=-90, le=90),
+    min_lon: float = QueryParam(ge=-180, le=180),
+    max_lat: float = QueryParam(ge=-90, le=90),
+    max_lon: float = QueryParam(ge=-180, le=180),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(db_helper.read_session_getter),
+    after: int | None = None,
+    limit: int = QueryParam(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+):
+    """
+    Получает страницу истории запросов с координатами
+    внутри прямоугольной области.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Minimum coordinates must not exceed maximum coordinates",
+        )
+
+    history, next_cursor = await get_bbox_page(
+        db, min_lat, min_lon, max_lat, max_lon, after, limit
+    )
+    return HistoryResponse(items=history, next_cursor=next_cursor)
+
+
+@router.get("/history/near", response_model=NearbyResponse)
+async def get_history_near(
+    latitude: float = QueryParam(ge=-90, le=90),
+    longitude: float = QueryParam(ge=-180, le=180),
+    radius: float = QueryParam(gt=0, le=NEARBY_MAX_RADIUS),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(db_helper.read_session_getter),
+    limit: int = QueryParam(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+):
+    """
+    Получает ближайшие запросы в радиусе (в метрах) от точки,
+    упорядоченные по расстоянию.
+    """
+    nearby = await get_nearby(db, latitude, longitude, radius, limit)
+    return NearbyResponse(
+        items=[
+            NearbyQueryRead(
+                **QueryRead.model_validate(query).model_dump(), distance=distance
+            )
+            for query, distance in nearby
+        ]
+    )
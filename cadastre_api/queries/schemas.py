@@ -1,4 +1,7 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from enum import Enum
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 class QueryCreate(BaseModel):
@@ -12,6 +15,23 @@ class QueryCreate(BaseModel):
     latitude: str = Field(title="latitude", pattern="-?\d{1,3}\.\d+")
     longitude: str = Field(title="longitude", pattern="-?\d{1,3}\.\d+")
 
+    @field_validator("latitude")
+    @classmethod
+    def check_latitude(cls, value: str) -> str:
+        if not -90 <= float(value) <= 90:
+            raise ValueError("Latitude must be between -90 and 90")
+        return value
+
+    @field_validator("longitude")
+    @classmethod
+    def check_longitude(cls, value: str) -> str:
+        if not -180 <= float(value) <= 180:
+            raise ValueError("Longitude must be between -180 and 180")
+        return value
+
+
+CADASTRE_PREFIX_PATTERN = r"^\d{1,2}(:\d{1,2}(:\d{1,7}(:\d{1,9})?)?)?$"
+
 
 class QueryResponse(BaseModel):
     """
@@ -21,9 +41,119 @@ class QueryResponse(BaseModel):
     id: int = Field(title="id")
 
 
+class QueryBatchResponse(BaseModel):
+    """
+    Схема ответа на пакетный запрос.
+    """
+
+    ids: list[int] = Field(title="ids")
+
+
+class ExportFormat(str, Enum):
+    """
+    Формат выгрузки истории запросов.
+    """
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class QueryStatus(str, Enum):
+    """
+    Статус обработки запроса.
+    """
+
+    PENDING = "pending"
+    DONE = "done"
+    # Внешний сервер не ответил за отведенное число попыток
+    FAILED = "failed"
+
+
 class ResultResponse(BaseModel):
     """
     Схема результата запроса.
     """
 
-    result: bool = Field(title="result")
+    status: QueryStatus = Field(title="status")
+    result: bool | None = Field(title="result", default=None)
+
+
+class ResultItem(ResultResponse):
+    """
+    Схема результата одного из запросов в ответе /results.
+    """
+
+    id: int = Field(title="id")
+
+
+class ResultsResponse(BaseModel):
+    """
+    Схема результатов нескольких запросов; missing - идентификаторы
+    несуществующих запросов.
+    """
+
+    items: list[ResultItem] = Field(title="items")
+    missing: list[int] = Field(title="missing", default=[])
+
+
+class QueryRead(BaseModel):
+    """
+    Схема запроса в истории запросов.
+    """
+
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int = Field(title="id")
+    cadastre_number: str = Field(title="cadastre_number")
+    latitude: float = Field(title="latitude")
+    longitude: float = Field(title="longitude")
+    result: bool | None = Field(title="result", default=None)
+    created_at: datetime | None = Field(title="created_at", default=None)
+    completed_at: datetime | None = Field(title="completed_at", default=None)
+
+
+class HistoryResponse(BaseModel):
+    """
+    Схема страницы истории запросов.
+    """
+
+    items: list[QueryRead] = Field(title="items")
+    next_cursor: int | None = Field(title="next_cursor", default=None)
+
+
+class NearbyQueryRead(QueryRead):
+    """
+    Схема запроса в истории с расстоянием до точки поиска.
+    """
+
+    distance: float = Field(title="distance")
+
+
+class NearbyResponse(BaseModel):
+    """
+    Схема ответа на поиск запросов в радиусе от точки.
+    """
+
+    items: list[NearbyQueryRead] = Field(title="items")
+
+
+class StatsItem(BaseModel):
+    """
+    Статистика результатов по округу или кварталу.
+    """
+
+    district: int = Field(title="district")
+    area: int | None = Field(title="area", default=None)
+    quarter: int | None = Field(title="quarter", default=None)
+    true_count: int = Field(title="true_count")
+    false_count: int = Field(title="false_count")
+    total: int = Field(title="total")
+    true_ratio: float | None = Field(title="true_ratio")
+
+
+class StatsResponse(BaseModel):
+    """
+    Статистика результатов по округам или по кварталам округа.
+    """
+
+    items: list[StatsItem]
@@ -0,0 +1,392 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+
+from config import db_helper
+from metrics.collectors import EXTERNAL_DURATION
+from queries.external import external_client
+from queries.geo import EARTH_RADIUS, cover_bbox, encode_geohash, radius_bboxes
+from queries.jobs import complete_job, create_jobs
+from queries.models import JobStatus, LookupJob, Query
+from queries.notifications import result_broker
+from queries.schemas import (ExportFormat, QueryCreate, QueryStatus,
+                             ResultResponse)
+from queries.stats import record_result
+from sqlalchemy import (ColumnElement, Integer, Select, and_, any_, bindparam,
+                        func, insert, or_, select, update)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+BATCH_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 5000
+CADASTRE_PARTS = (Query.district, Query.area, Query.quarter, Query.parcel)
+EXPORT_COLUMNS = (
+    Query.id,
+    Query.cadastre_number,
+    Query.latitude,
+    Query.longitude,
+    Query.result,
+)
+HISTORY_COLUMNS = (
+    *EXPORT_COLUMNS,
+    Query.created_at,
+    Query.completed_at,
+)
+
+
+async def request_external_server(query: Query) -> bool:
+    """
+    Запрашивает результат для запроса у внешнего сервера.
+    """
+    with EXTERNAL_DURATION.time():
+        return await external_client.lookup(
+            query.cadastre_number, query.latitude, query.longitude
+        )
+
+
+def split_cadastre_number(number: str) -> list[int]:
+    """
+    Разбивает кадастровый номер или его префикс на числовые части.
+    """
+    return [int(part) for part in number.split(":")]
+
+
+def lookup_key(query: Query) -> tuple:
+    """
+    Нормализованный ключ запроса к внешнему серверу:
+    части кадастрового номера и координаты.
+    """
+    return (
+        tuple(split_cadastre_number(query.cadastre_number)),
+        round(query.latitude, 6),
+        round(query.longitude, 6),
+    )
+
+
+def query_values(request: QueryCreate) -> dict:
+    """
+    Формирует значения столбцов нового запроса.
+    """
+    parts = split_cadastre_number(request.cadastre_number)
+    latitude = float(request.latitude)
+    longitude = float(request.longitude)
+    return {
+        "cadastre_number": request.cadastre_number,
+        "latitude": latitude,
+        "longitude": longitude,
+        "geohash": encode_geohash(latitude, longitude),
+        "result": None,
+        **{column.key: part for column, part in zip(CADASTRE_PARTS, parts)},
+    }
+
+
+async def insert_queries(values: list[dict], db: AsyncSession) -> list[int]:
+    """
+    Вставляет запросы многострочными INSERT ... RETURNING по BATCH_CHUNK_SIZE
+    строк вместе с заданиями в транзакции db и возвращает идентификаторы
+    в порядке значений.
+    """
+    stmt = insert(Query).returning(Query.id, sort_by_parameter_order=True)
+    ids = []
+    for start in range(0, len(values), BATCH_CHUNK_SIZE):
+        result = await db.execute(stmt, values[start : start + BATCH_CHUNK_SIZE])
+        chunk_ids = result.scalars().all()
+        await create_jobs(chunk_ids, db)
+        ids.extend(chunk_ids)
+    return ids
+
+
+async def create_queries(queries: list[QueryCreate], db: AsyncSession) -> list[int]:
+    """
+    Сохраняет запросы в одной транзакции и возвращает идентификаторы
+    в порядке запросов.
+    """
+    ids = await insert_queries([query_values(query) for query in queries], db)
+    await db.commit()
+    return ids
+
+
+def filter_history(
+    stmt: Select,
+    number: str | None,
+    prefix: str | None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Select:
+    """
+    Добавляет к выборке фильтры по кадастровому номеру,
+    по префиксу кадастрового номера любого уровня и по периоду
+    [since, until); фильтр по периоду позволяет Postgres читать
+    только секции за нужные месяцы.
+    """
+    if number is not None:
+        stmt = stmt.where(Query.cadastre_number == number)
+    if prefix is not None:
+        parts = split_cadastre_number(prefix)
+        stmt = stmt.where(
+            *(column == part for column, part in zip(CADASTRE_PARTS, parts))
+        )
+    if since is not None:
+        stmt = stmt.where(Query.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(Query.created_at < until)
+    return stmt
+
+
+def bbox_condition(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> ColumnElement[bool]:
+    """
+    Возвращает условие попадания в прямоугольную область: сначала кандидаты
+    отбираются по индексу geohash, затем точно по координатам.
+    """
+    conditions = []
+    cells = [cell for cell in cover_bbox(min_lat, min_lon, max_lat, max_lon) if cell]
+    if cells:
+        # "~" больше любого символа geohash, поэтому диапазон [cell, cell~)
+        # содержит ровно все хэши с этим префиксом
+        conditions.append(
+            or_(
+                *(
+                    and_(Query.geohash >= cell, Query.geohash < cell + "~")
+                    for cell in cells
+                )
+            )
+        )
+    return and_(
+        *conditions,
+        Query.latitude.between(min_lat, max_lat),
+        Query.longitude.between(min_lon, max_lon),
+    )
+
+
+def filter_bbox(
+    stmt: Select, min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> Select:
+    """
+    Добавляет к выборке фильтр по прямоугольной области.
+    """
+    return stmt.where(bbox_condition(min_lat, min_lon, max_lat, max_lon))
+
+
+def distance_to(latitude: float, longitude: float):
+    """
+    Возвращает SQL-выражение расстояния в метрах от точки
+    до координат запроса (формула гаверсинусов).
+    """
+    delta_lat = func.radians(Query.latitude - latitude) / 2
+    delta_lon = func.radians(Query.longitude - longitude) / 2
+    haversine = func.power(func.sin(delta_lat), 2) + func.cos(
+        func.radians(latitude)
+    ) * func.cos(func.radians(Query.latitude)) * func.power(func.sin(delta_lon), 2)
+    return 2 * EARTH_RADIUS * func.asin(func.sqrt(haversine))
+
+
+def page_statement(stmt: Select, after: int | None, limit: int) -> Select:
+    """
+    Ограничивает выборку страницей после курсора; запрашивается
+    на одну строку больше, чтобы узнать, есть ли следующая страница.
+    """
+    stmt = stmt.order_by(Query.id).limit(limit + 1)
+    if after is not None:
+        stmt = stmt.where(Query.id > after)
+    return stmt
+
+
+async def paginate(
+    db: AsyncSession, stmt: Select, after: int | None, limit: int
+) -> tuple[list[Query], int | None]:
+    """
+    Возвращает страницу выборки, упорядоченную по идентификатору,
+    и курсор следующей страницы (None, если страница последняя).
+    """
+    result = await db.scalars(page_statement(stmt, after, limit))
+    history = list(result)
+    if len(history) > limit:
+        history = history[:limit]
+        return history, history[-1].id
+    return history, None
+
+
+def history_statement(
+    number: str | None,
+    after: int | None,
+    limit: int,
+    prefix: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Select:
+    """
+    Выборка страницы истории запросов по кадастровому номеру
+    или префиксу за период, только со столбцами ответа.
+    """
+    stmt = filter_history(select(*HISTORY_COLUMNS), number, prefix, since, until)
+    return page_statement(stmt, after, limit)
+
+
+async def get_history_rows(
+    db: AsyncSession,
+    number: str | None,
+    after: int | None,
+    limit: int,
+    prefix: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> tuple[list[dict], int | None]:
+    """
+    Возвращает страницу истории запросов строками-словарями, без
+    создания объектов ORM: их можно сразу передать в FastJSONResponse.
+    """
+    result = await db.execute(
+        history_statement(number, after, limit, prefix, since, until)
+    )
+    keys = [column.key for column in HISTORY_COLUMNS]
+    history = [dict(zip(keys, row)) for row in result.tuples()]
+    if len(history) > limit:
+        history = history[:limit]
+        return history, history[-1]["id"]
+    return history, None
+
+
+async def get_bbox_page(
+    db: AsyncSession,
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    after: int | None,
+    limit: int,
+) -> tuple[list[Query], int | None]:
+    """
+    Возвращает страницу истории запросов внутри прямоугольной области.
+    """
+    stmt = filter_bbox(select(Query), min_lat, min_lon, max_lat, max_lon)
+    return await paginate(db, stmt, after, limit)
+
+
+async def get_nearby(
+    db: AsyncSession, latitude: float, longitude: float, radius: float, limit: int
+) -> list[tuple[Query, float]]:
+    """
+    Возвращает ближайшие запросы в радиусе от точки (в метрах)
+    вместе с расстоянием до них, упорядоченные по расстоянию.
+    """
+    distance = distance_to(latitude, longitude).label("distance")
+    boxes = radius_bboxes(latitude, longitude, radius)
+    stmt = select(Query, distance).where(or_(*(bbox_condition(*box) for box in boxes)))
+    stmt = stmt.where(distance <= radius).order_by(distance).limit(limit)
+    result = await db.execute(stmt)
+    return list(result.tuples())
+
+
+def _encode_rows(rows: list, export_format: ExportFormat) -> str:
+    if export_format is ExportFormat.CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(row._asdict()) + "\n" for row in rows)
+
+
+async def export_history(
+    number: str | None,
+    export_format: ExportFormat,
+    prefix: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> AsyncIterator[str]:
+    """
+    Выгружает историю запросов по частям через курсор на стороне сервера,
+    не загружая всю таблицу в память.
+    """
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .order_by(Query.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    stmt = filter_history(stmt, number, prefix, since, until)
+
+    if export_format is ExportFormat.CSV:
+        yield _encode_rows([[column.key for column in EXPORT_COLUMNS]], export_format)
+
+    # Сессия открывается здесь, а не через зависимость: зависимость
+    # закрывается раньше, чем ответ будет полностью отправлен
+    async with db_helper.read_session_factory() as db:
+        result = await db.stream(stmt)
+        async for rows in result.partitions():
+            yield _encode_rows(rows, export_format)
+
+
+async def get_query(query_id: int) -> Query | None:
+    """
+    Загружает запрос в отдельной короткой транзакции.
+    """
+    async with db_helper.transaction() as db:
+        return await db.get(Query, query_id)
+
+
+async def save_result(query_id: int, result: bool) -> None:
+    """
+    Сохраняет результат запроса в отдельной короткой транзакции,
+    если он еще не был определен, завершает задание, учитывает
+    результат в статистике и рассылает его подписчикам.
+    """
+    async with db_helper.transaction() as db:
+        await complete_job(query_id, db)
+        saved = (
+            await db.execute(
+                update(Query)
+                .where(Query.id == query_id, Query.result.is_(None))
+                .values(result=result, completed_at=func.now())
+                .returning(Query.district, Query.area, Query.quarter)
+            )
+        ).first()
+        if saved is not None:
+            if saved.district is not None:
+                await record_result(db, *saved, result)
+            await result_broker.notify(db, query_id, result)
+    if saved is not None:
+        result_broker.publish(query_id, result)
+
+
+def result_response(result: bool | None, failed: bool = False) -> ResultResponse:
+    """
+    Статус и результат запроса; failed - задание исчерпало попытки.
+    """
+    if result is not None:
+        return ResultResponse(status=QueryStatus.DONE, result=result)
+    if failed:
+        return ResultResponse(status=QueryStatus.FAILED)
+    return ResultResponse(status=QueryStatus.PENDING)
+
+
+def results_statement(query_ids: list[int], dialect: str) -> Select:
+    """
+    Выбирает результаты запросов по идентификаторам вместе со статусами
+    их заданий. На Postgres условие id = ANY(:ids) передает идентификаторы
+    одним параметром-массивом: текст запроса не зависит от их числа,
+    и подготовленный оператор переиспользуется; в других СУБД используется IN.
+    """
+    stmt = select(Query.id, Query.result, LookupJob.status).outerjoin(
+        LookupJob, LookupJob.query_id == Query.id
+    )
+    if dialect == "postgresql":
+        ids = bindparam("ids", query_ids, type_=ARRAY(Integer))
+        return stmt.where(Query.id == any_(ids))
+    return stmt.where(Query.id.in_(query_ids))
+
+
+async def get_results(query_ids: Iterable[int]) -> dict[int, ResultResponse]:
+    """
+    Возвращает текущие статусы и результаты существующих запросов
+    в отдельной короткой транзакции.
+    """
+    async with db_helper.transaction() as db:
+        rows = await db.execute(
+            results_statement(list(query_ids), db.bind.dialect.name)
+        )
+        return {
+            query_id: result_response(result, job_status == JobStatus.FAILED)
+            for query_id, result, job_status in rows
+        }
@@ -0,0 +1,82 @@
+from config import db_helper
+from queries.models import Query, QueryStats
+from sqlalchemy import Integer, delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as upsert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def record_result(
+    db: AsyncSession, district: int, area: int, quarter: int, result: bool
+) -> None:
+    """
+    Учитывает результат запроса в статистике квартала
+    в транзакции записи результата.
+    """
+    stmt = upsert(QueryStats).values(
+        district=district,
+        area=area,
+        quarter=quarter,
+        true_count=int(result),
+        false_count=int(not result),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[QueryStats.district, QueryStats.area, QueryStats.quarter],
+        set_={
+            "true_count": QueryStats.true_count + stmt.excluded.true_count,
+            "false_count": QueryStats.false_count + stmt.excluded.false_count,
+        },
+    )
+    await db.execute(stmt)
+
+
+async def get_stats(db: AsyncSession, district: int | None = None) -> list[dict]:
+    """
+    Возвращает статистику по округам или, если округ указан,
+    по кварталам округа.
+    """
+    if district is None:
+        keys = (QueryStats.district,)
+        stmt = select(
+            QueryStats.district,
+            func.sum(QueryStats.true_count).label("true_count"),
+            func.sum(QueryStats.false_count).label("false_count"),
+        ).group_by(QueryStats.district)
+    else:
+        keys = (QueryStats.district, QueryStats.area, QueryStats.quarter)
+        stmt = select(*keys, QueryStats.true_count, QueryStats.false_count).where(
+            QueryStats.district == district
+        )
+
+    rows = await db.execute(stmt.order_by(*keys))
+    return [row._asdict() for row in rows]
+
+
+async def rebuild_stats() -> int:
+    """
+    Пересчитывает статистику по таблице запросов, исправляя возможное
+    расхождение. Запись результатов ожидает окончания пересчета:
+    результаты, записанные после него, учитываются как обычно.
+    Возвращает число кварталов.
+    """
+    async with db_helper.transaction() as db:
+        if db.bind.dialect.name == "postgresql":
+            await db.execute(text("LOCK TABLE query_stats IN EXCLUSIVE MODE"))
+        await db.execute(delete(QueryStats))
+        counts = (
+            select(
+                Query.district,
+                Query.area,
+                Query.quarter,
+                func.sum(Query.result.cast(Integer)),
+                func.sum((~Query.result).cast(Integer)),
+            )
+            .where(Query.result.is_not(None), Query.district.is_not(None))
+            .group_by(Query.district, Query.area, Query.quarter)
+        )
+        await db.execute(
+            insert(QueryStats).from_select(
+                ["district", "area", "quarter", "true_count", "false_count"],
+                counts,
+            )
+        )
+        return await db.scalar(select(func.count()).select_from(QueryStats))
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+
+from config import db_helper
+from config.config import settings
+from queries.cache import result_cache
+from queries.jobs import (claim_jobs, complete_job, release_jobs, renew_jobs,
+                          retry_job)
+from queries.services import (get_query, lookup_key, request_external_server,
+                              save_result)
+
+logger = logging.getLogger(__name__)
+
+
+class LookupWorker:
+    """
+    Пул асинхронных обработчиков, выполняющих запросы
+    на внешний сервер в фоне, вне HTTP-запроса.
+
+    Задания хранятся в базе данных (таблица lookup_job), поэтому они
+    переживают перезапуск процесса и распределяются между всеми
+    процессами и узлами, на которых запущен обработчик.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 1000,
+        batch_size: int = 100,
+        lease: float = 300,
+        poll_interval: float = 1,
+        max_attempts: int = 5,
+        retry_delay: float = 10,
+    ):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.running: dict[int, asyncio.Task] = {}
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.stopping = False
+        self.renewed_at = 0.0
+
+    async def start(self) -> None:
+        self.stopping = False
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Отмена может быть потеряна, если она пришлась на завершение
+        # операции с БД, поэтому цикл проверяет и флаг остановки;
+        # задания собираются после его завершения, включая забранные
+        # в последней пачке
+        self.stopping = True
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        query_ids = list(self.running)
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Незавершенные задания сразу достанутся другим процессам,
+        # не дожидаясь окончания аренды
+        try:
+            await release_jobs(query_ids)
+        except Exception:
+            logger.exception("Could not release lookup jobs")
+
+    def wake(self) -> None:
+        """
+        Сообщает, что появились новые задания, чтобы они были забраны
+        без ожидания следующего опроса. Сами задания уже сохранены
+        в базе данных вместе с запросами.
+        """
+        self.wakeup.set()
+
+    async def process(self, query_id: int) -> None:
+        # Чтение, запрос на внешний сервер и запись выполняются раздельно,
+        # чтобы соединение с БД не удерживалось на время ожидания
+        query = await get_query(query_id)
+        if query is None or query.result is not None:
+            async with db_helper.transaction() as db:
+                await complete_job(query_id, db)
+            return
+        result = await result_cache.get_or_fetch(
+            lookup_key(query), lambda: request_external_server(query)
+        )
+        await save_result(query_id, result)
+
+    async def _process(self, query_id: int) -> None:
+        try:
+            await self.process(query_id)
+        except Exception:
+            logger.exception("Lookup for query %s failed", query_id)
+            try:
+                await retry_job(query_id, self.max_attempts, self.retry_delay)
+            except Exception:
+                # Задание вернется в очередь по окончании аренды
+                logger.exception("Could not reschedule query %s", query_id)
+        finally:
+            if self.running.get(query_id) is asyncio.current_task():
+                del self.running[query_id]
+            self.wakeup.set()
+
+    async def renew(self) -> None:
+        # Задания ждут в очереди клиента внешнего сервера и повторяются,
+        # поэтому могут выполняться дольше аренды: она продлевается,
+        # пока задание не завершится
+        if not self.running or time.monotonic() < self.renewed_at + self.lease / 3:
+            return
+        self.renewed_at = time.monotonic()
+        try:
+            await renew_jobs(list(self.running), self.lease)
+        except Exception:
+            logger.exception("Could not renew lookup job leases")
+
+    async def _run(self) -> None:
+        while not self.stopping:
+            self.wakeup.clear()
+            await self.renew()
+            limit = min(self.batch_size, self.concurrency - len(self.running))
+            claimed = []
+            if limit > 0:
+                try:
+                    claimed = await claim_jobs(limit, self.lease, self.max_attempts)
+                except Exception:
+                    logger.exception("Could not claim lookup jobs")
+            for query_id in claimed:
+                # Аренда своего задания могла истечь, если ее не удалось
+                # продлить; оно все еще выполняется
+                if query_id in self.running:
+                    continue
+                self.running[query_id] = asyncio.create_task(self._process(query_id))
+            if limit > 0 and len(claimed) == limit:
+                # Заданий может быть больше: забираем следующую пачку сразу
+                continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+lookup_worker = LookupWorker(
+    concurrency=settings.worker.concurrency,
+    batch_size=settings.worker.batch_size,
+    lease=settings.worker.lease,
+    poll_interval=settings.worker.poll_interval,
+    max_attempts=settings.worker.max_attempts,
+    retry_delay=settings.worker.retry_delay,
+)
@@ -0,0 +1,25 @@
+from config.cache import TTLCache
+from config.config import settings
+
+
+class AuthCache:
+    """
+    Caches decoded access tokens and the users they belong to,
+    so that authenticated requests do not query the database.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 60):
+        self.tokens = TTLCache(max_size=max_size, ttl=ttl)
+        self.users = TTLCache(max_size=max_size, ttl=ttl)
+
+    def invalidate_user(self, username: str) -> None:
+        """
+        Drops the cached user, e.g. after it has been created or changed.
+        """
+        self.users.invalidate(username)
+
+
+auth_cache = AuthCache(
+    max_size=settings.auth.cache_size,
+    ttl=settings.auth.cache_ttl,
+)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+
+from config.config import settings
+from fastapi import HTTPException, status
+from metrics.collectors import (BCRYPT_OPERATIONS, BCRYPT_REJECTED,
+                                BCRYPT_SECONDS)
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+
+def _timed(func, *args):
+    """
+    Runs func in the executor and returns its result with the time
+    spent, so that the queue wait is not counted as bcrypt time.
+    """
+    started = time.perf_counter()
+    return func(*args), time.perf_counter() - started
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded executor
+    so that it does not block the event loop.
+    """
+
+    def __init__(
+        self,
+        executor: str = "thread",
+        workers: int | None = None,
+        queue_size: int = 100,
+    ):
+        self.executor_type = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if self.executor_type == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+        return self.executor
+
+    async def _run(self, operation: str, func, *args):
+        executor = self._get_executor()
+        if self._slots.locked():
+            # The queue is full: fail fast instead of waiting
+            BCRYPT_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent authentication requests",
+                headers={"Retry-After": "1"},
+            )
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            result, elapsed = await loop.run_in_executor(executor, _timed, func, *args)
+        BCRYPT_SECONDS.labels(operation).inc(elapsed)
+        BCRYPT_OPERATIONS.labels(operation).inc()
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run("verify", _verify, password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_hasher = PasswordHasher(
+    executor=settings.hashing.executor,
+    # Worker processes share the cores
+    workers=settings.hashing.workers
+    or max((os.cpu_count() or 1) // settings.run.workers, 1),
+    queue_size=settings.hashing.queue_size,
+)
@@ -27,7 +27,7 @@ async def add_user(
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: UserCreate, db: AsyncSession = Depends(db_helper.session_getter)
+    form_data: UserCreate, db: AsyncSession = Depends(db_helper.read_session_getter)
 ):
     """
     Obtaining a JWT token to access the API.
@@ -58,7 +58,7 @@ async def login_for_access_token(
 
 @router.post("/token/refresh", response_model=Token)
 async def refresh_token(
-    form_data: RefreshToken, db: AsyncSession = Depends(db_helper.session_getter)
+    form_data: RefreshToken, db: AsyncSession = Depends(db_helper.read_session_getter)
 ):
     """
     Refreshes the JWT token using the refresh token.
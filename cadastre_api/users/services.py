@@ -1,38 +1,42 @@
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Callable, Union
 
 import jwt
 from config import db_helper
 from config.config import MINUTES
+from config.database import stick_to_primary
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import Select, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from users.cache import auth_cache
+from users.hashing import password_hasher
 from users.models import User
 from users.schemas import UserCreate
 
 load_dotenv()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# For routes that accept anonymous requests too
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 
-def hash_password(password: str) -> str:
+async def hash_password(password: str) -> str:
     """
-    Hashes a password using bcrypt.
+    Hashes a password using bcrypt off the event loop.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    return pwd_context.hash(password)
+    return await password_hasher.hash(password)
 
 
 async def create_user(user: UserCreate, db: AsyncSession):
     """
     Creates a new user in the database.
     """
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -43,6 +47,7 @@ async def create_user(user: UserCreate, db: AsyncSession):
     try:
         await db.commit()
         await db.refresh(db_user)
+        auth_cache.invalidate_user(db_user.username)
         return db_user
     except IntegrityError:
         await db.rollback()
@@ -52,13 +57,23 @@ async def create_user(user: UserCreate, db: AsyncSession):
         )
 
 
+def user_by_username_statement(username: str) -> Select:
+    """
+    Builds the statement that selects a user by username.
+    """
+    return select(User).filter(User.username == username)
+
+
 async def get_user_by_username(username: str, db: AsyncSession):
     """
     Get user data by user username.
     """
-    stmt = select(User).filter(User.username == username)
-    db_users = await db.scalars(stmt)
+    db_users = await db.scalars(user_by_username_statement(username))
     db_user = db_users.first()
+    if db_user is None and stick_to_primary(db):
+        # A user created a moment ago may not have reached the replica yet
+        db_users = await db.scalars(user_by_username_statement(username))
+        db_user = db_users.first()
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -110,12 +125,11 @@ def create_refresh_token(data: dict, expires_delta: timedelta = None) -> str:
         )
 
 
-def verify_password(plain_password, hashed_password) -> bool:
+async def verify_password(plain_password, hashed_password) -> bool:
     """
-    Verify password against hashed password.
+    Verify password against hashed password off the event loop.
     """
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
 async def authenticate_user(
@@ -127,14 +141,37 @@ async def authenticate_user(
     user = await user(user_id, db)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return False
     return user
 
 
+def token_username(token: str) -> str | None:
+    """
+    Returns the username of a valid access token, or None.
+    Decoded tokens are cached until they expire.
+    """
+    username = auth_cache.tokens.get(token)
+    if username is None:
+        try:
+            decoded_jwt = jwt.decode(
+                token, os.getenv("SECRET"), algorithms=[os.getenv("ALGORITHM")]
+            )
+        except jwt.PyJWTError:
+            return None
+        username = decoded_jwt.get("sub")
+        if username is None:
+            return None
+        # A cached token must not outlive its own expiration time
+        auth_cache.tokens.set(
+            token, username, ttl=decoded_jwt.get("exp", time.time()) - time.time()
+        )
+    return username
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(db_helper.session_getter),
+    db: AsyncSession = Depends(db_helper.read_session_getter),
 ) -> User:
     """
     Uses OAuth2PasswordBearer to authenticate a user.
@@ -144,18 +181,16 @@ async def get_current_user(
         detail="Не удалось подтвердить подлинность токена",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        decoded_jwt = jwt.decode(
-            token, os.getenv("SECRET"), algorithms=[os.getenv("ALGORITHM")]
-        )
-        username = decoded_jwt.get("sub")
-        if username is None:
-            raise exception
-    except jwt.PyJWTError:
+    username = token_username(token)
+    if username is None:
         raise exception
-    user = await get_user_by_username(username, db)
+
+    user = auth_cache.users.get(username)
     if user is None:
-        raise exception
+        user = await get_user_by_username(username, db)
+        if user is None:
+            raise exception
+        auth_cache.users.set(username, user)
     return user
 
 